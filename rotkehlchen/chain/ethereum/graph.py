@@ -1,12 +1,15 @@
 import json
 import logging
 import re
-from typing import Any, Dict, Literal, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
 import gevent
 import requests
+from gevent.lock import Semaphore
 from gql import Client, gql
 from gql.transport.requests import RequestsHTTPTransport
+from requests.adapters import HTTPAdapter
 
 from rotkehlchen.constants.timing import QUERY_RETRY_TIMES
 from rotkehlchen.errors.misc import RemoteError
@@ -19,6 +22,11 @@ log = RotkehlchenLogsAdapter(logger)
 
 GRAPH_QUERY_LIMIT = 1000
 GRAPH_QUERY_SKIP_LIMIT = 5000
+# Sizing of the per-subgraph connection pool and how many queries may be
+# in flight at once. Concurrent greenlets past the semaphore limit simply
+# wait, which keeps a big address fan-out from tripping rate limiting
+GRAPH_CONNECTION_POOL_SIZE = 16
+GRAPH_CONCURRENT_QUERY_LIMIT = 12
 RE_MULTIPLE_WHITESPACE = re.compile(r'\s+')
 RETRY_BACKOFF_FACTOR = 0.2
 SUBGRAPH_REMOTE_ERROR_MSG = (
@@ -28,6 +36,32 @@ SUBGRAPH_REMOTE_ERROR_MSG = (
 )
 
 
+@lru_cache(maxsize=64)
+def _render_query_prelude(param_types_items: Tuple[Tuple[str, str], ...]) -> str:
+    """Render the query's variable declaration prelude, cached
+
+    The param_types of a query never change between its pages or retries,
+    so the json round-trip that turns them into the
+    query ($limit: Int!, ...) { prelude is paid once per distinct set of
+    variables instead of once per request.
+    """
+    prefix = 'query '
+    prefix += json.dumps(dict(param_types_items)).replace('"', '').replace('{', '(').replace('}', ')')  # noqa: E501
+    prefix += '{'
+    return prefix
+
+
+@lru_cache(maxsize=64)
+def _parse_gql_document(querystr: str) -> Any:
+    """Parse a GraphQL query string into a gql document, cached
+
+    Pagination reuses the exact same query string for every page and the
+    retry logic for every attempt, so the (expensive) graphql parse is
+    paid once per distinct query instead of once per request.
+    """
+    return gql(querystr)
+
+
 def format_query_indentation(querystr: str) -> str:
     """Format a triple quote and indented GraphQL query by:
     - Removing returns
@@ -58,10 +92,18 @@ def get_common_params(
 
 class Graph():
 
-    def __init__(self, url: str) -> None:
+    def __init__(self, url: str, pool_size: int = GRAPH_CONNECTION_POOL_SIZE) -> None:
         """
         - May raise requests.RequestException if there is a problem connecting to the subgraph"""
         transport = RequestsHTTPTransport(url=url)
+        # The transport keeps a requests.Session for the life of the instance
+        # so connections are already kept alive between pages. Mount an
+        # adapter with a bigger pool than the requests default of 10 so
+        # concurrent greenlets reuse connections instead of discarding them
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size * 2)
+        for prefix in ('http://', 'https://'):
+            transport.session.mount(prefix, adapter)
+        self._query_semaphore = Semaphore(GRAPH_CONCURRENT_QUERY_LIMIT)
         try:
             self.client = Client(transport=transport, fetch_schema_from_transport=False)
         except (requests.exceptions.RequestException) as e:
@@ -81,17 +123,17 @@ class Graph():
         """
         prefix = ''
         if param_types is not None:
-            prefix = 'query '
-            prefix += json.dumps(param_types).replace('"', '').replace('{', '(').replace('}', ')')
-            prefix += '{'
+            prefix = _render_query_prelude(tuple(param_types.items()))
 
         querystr = prefix + querystr
         log.debug(f'Querying The Graph for {querystr}')
 
+        document = _parse_gql_document(querystr)
         retries_left = QUERY_RETRY_TIMES
         while retries_left > 0:
             try:
-                result = self.client.execute(gql(querystr), variable_values=param_values)
+                with self._query_semaphore:
+                    result = self.client.execute(document, variable_values=param_values)
             # need to catch Exception here due to stupidity of gql library
             except (requests.exceptions.RequestException, Exception) as e:  # pylint: disable=broad-except  # noqa: E501
                 # NB: the lack of a good API error handling by The Graph combined
@@ -117,3 +159,45 @@ class Graph():
 
         log.debug('Got result from The Graph query')
         return result
+
+    def batch_query(
+            self,
+            sub_queries: List[Tuple[str, Dict[str, Any], Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        """Send multiple sub-queries to the subgraph as one aliased operation
+
+        Each entry is the (querystr, param_types, param_values) triplet that
+        would otherwise be given to query(). Every sub-query gets its own
+        alias and its variables get a per-sub-query suffix so they cannot
+        collide, which amortizes a single HTTP round-trip over all of them.
+        Returns the result of each sub-query in input order.
+
+        May raise:
+        - RemoteError: If there is a problem querying the subgraph and there
+        are no retries left.
+        """
+        merged_types: Dict[str, Any] = {}
+        merged_values: Dict[str, Any] = {}
+        parts = []
+        for idx, (querystr, param_types, param_values) in enumerate(sub_queries):
+            # drop the sub-query's operation-closing brace. The merged
+            # operation is closed once at the end instead
+            querystr = querystr.rstrip()[:-1]
+            for type_name, type_value in param_types.items():
+                # $limit of sub-query 0 becomes $limit_0 and so on
+                merged_types[f'{type_name}_{idx}'] = type_value
+                querystr = re.sub(
+                    pattern=rf'\{type_name}\b',
+                    repl=f'{type_name}_{idx}',
+                    string=querystr,
+                )
+            for value_name, value in param_values.items():
+                merged_values[f'{value_name}_{idx}'] = value
+            parts.append(f'q{idx}: {querystr}')
+
+        result = self.query(
+            querystr=' '.join(parts) + '}',
+            param_types=merged_types,
+            param_values=merged_values,
+        )
+        return [result[f'q{idx}'] for idx in range(len(sub_queries))]
@@ -13,6 +13,7 @@ from collections import defaultdict
 from datetime import datetime, time
 from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Set, Tuple
 
+import gevent
 from gevent.lock import Semaphore
 
 from rotkehlchen.accounting.structures.balance import Balance
@@ -30,6 +31,7 @@ from rotkehlchen.chain.ethereum.interfaces.ammswap.types import (
     AddressTrades,
     AggregatedAmount,
     AssetToPrice,
+    DDAddressEvents,
     DDAddressToLPBalances,
     EventType,
     LiquidityPool,
@@ -38,17 +40,18 @@ from rotkehlchen.chain.ethereum.interfaces.ammswap.types import (
     LiquidityPoolEventsBalance,
     ProtocolBalance,
 )
-from rotkehlchen.chain.ethereum.interfaces.ammswap.utils import SUBGRAPH_REMOTE_ERROR_MSG
+from rotkehlchen.chain.ethereum.interfaces.ammswap.utils import (
+    SUBGRAPH_REMOTE_ERROR_MSG,
+    deserialize_ethereum_address_cached,
+)
 from rotkehlchen.chain.ethereum.trades import AMMSwap, AMMTrade
 from rotkehlchen.constants import ZERO
-from rotkehlchen.db.ranges import DBQueryRanges
 from rotkehlchen.errors.misc import ModuleInitializationFailure, RemoteError
 from rotkehlchen.errors.serialization import DeserializationError
 from rotkehlchen.fval import FVal
 from rotkehlchen.inquirer import Inquirer
 from rotkehlchen.logging import RotkehlchenLogsAdapter
 from rotkehlchen.premium.premium import Premium
-from rotkehlchen.serialization.deserialize import deserialize_ethereum_address
 from rotkehlchen.types import (
     AssetAmount,
     ChecksumEthAddress,
@@ -58,6 +61,7 @@ from rotkehlchen.types import (
     TradeType,
 )
 from rotkehlchen.user_messages import MessagesAggregator
+from rotkehlchen.utils.mixins.cacheable import CacheableMixIn
 
 from .graph import (
     BURNS_QUERY,
@@ -109,8 +113,47 @@ def add_trades_from_swaps(
 UNISWAP_TRADES_PREFIX = 'uniswap_trades'
 SUSHISWAP_TRADES_PREFIX = 'sushiswap_trades'
 
-
-class AMMSwapPlatform(metaclass=abc.ABCMeta):
+# The subgraph query strings and their parameter types are fully static, so
+# format them once at import instead of once per query call
+MINTS_QUERYSTR = format_query_indentation(MINTS_QUERY.format())
+BURNS_QUERYSTR = format_query_indentation(BURNS_QUERY.format())
+SWAPS_QUERYSTR = format_query_indentation(SWAPS_QUERY.format())
+SUSHISWAP_SWAPS_QUERYSTR = format_query_indentation(SUSHISWAP_SWAPS_QUERY.format())
+LIQUIDITY_POSITIONS_QUERYSTR = format_query_indentation(LIQUIDITY_POSITIONS_QUERY.format())
+TOKEN_DAY_DATAS_QUERYSTR = format_query_indentation(TOKEN_DAY_DATAS_QUERY.format())
+
+EVENTS_PARAM_TYPES = {
+    '$limit': 'Int!',
+    '$offset': 'Int!',
+    '$address': 'Bytes!',
+    '$start_ts': 'BigInt!',
+    '$end_ts': 'BigInt!',
+    '$id': 'ID!',
+}
+SWAPS_PARAM_TYPES = {
+    '$limit': 'Int!',
+    '$offset': 'Int!',
+    '$address': 'Bytes!',
+    '$start_ts': 'BigInt!',
+    '$end_ts': 'BigInt!',
+    '$id': 'ID!',
+}
+LIQUIDITY_POSITIONS_PARAM_TYPES = {
+    '$limit': 'Int!',
+    '$offset': 'Int!',
+    '$addresses': '[String!]',
+    '$balance': 'BigDecimal!',
+    '$id': 'ID!',
+}
+TOKEN_DAY_DATAS_PARAM_TYPES = {
+    '$limit': 'Int!',
+    '$offset': 'Int!',
+    '$token_ids': '[String!]',
+    '$datetime': 'Int!',
+}
+
+
+class AMMSwapPlatform(CacheableMixIn, metaclass=abc.ABCMeta):
     """AMM Module interace"""
     def __init__(
             self,
@@ -121,6 +164,7 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             msg_aggregator: MessagesAggregator,
             graph: Graph,
     ) -> None:
+        super().__init__()
         self.location = location
         self.ethereum = ethereum_manager
         self.database = database
@@ -129,16 +173,21 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
         self.data_directory = database.user_data_dir.parent
         self.trades_lock = Semaphore()
         self.graph = graph
+        # Memo of token prices from the subgraph. The subgraph provides one
+        # price per token per day, so entries are valid for the day they
+        # were fetched and the memo is dropped when the day rolls over
+        self._price_cache: Dict[ChecksumEthAddress, Price] = {}
+        self._price_cache_epoch = 0
 
         if self.location == Location.UNISWAP:
             self.mint_event = EventType.MINT_UNISWAP
             self.burn_event = EventType.BURN_UNISWAP
-            self.swaps_query = SWAPS_QUERY
+            self.swaps_querystr = SWAPS_QUERYSTR
             self.trades_prefix = UNISWAP_TRADES_PREFIX
         elif self.location == Location.SUSHISWAP:
             self.mint_event = EventType.MINT_SUSHISWAP
             self.burn_event = EventType.BURN_SUSHISWAP
-            self.swaps_query = SUSHISWAP_SWAPS_QUERY
+            self.swaps_querystr = SUSHISWAP_SWAPS_QUERYSTR
             self.trades_prefix = SUSHISWAP_TRADES_PREFIX
         else:
             raise NotImplementedError(f'AMM platform with location {self.location} not valid.')
@@ -351,56 +400,150 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
                 # Update <LiquidityPool> total balance in USD
                 lp.user_balance.usd_value = total_user_balance
 
+    def _get_or_create_graph_token(
+            self,
+            token_data: Dict[str, Any],
+            token_address: ChecksumEthAddress,
+            token_cache: Dict[ChecksumEthAddress, EthereumToken],
+    ) -> EthereumToken:
+        """Resolve a subgraph token entry into an EthereumToken, memoized
+
+        The same few token addresses repeat for thousands of entries within
+        a single subgraph query and get_or_create_ethereum_token goes
+        through the DB every call, so repeats are served from `token_cache`
+        which the caller scopes to one query.
+        """
+        token = token_cache.get(token_address)
+        if token is None:
+            token = get_or_create_ethereum_token(
+                userdb=self.database,
+                symbol=token_data['symbol'],
+                ethereum_address=token_address,
+                name=token_data['name'],
+                decimals=int(token_data['decimals']),
+            )
+            token_cache[token_address] = token
+        return token
+
+    def _query_graph_page(
+            self,
+            querystr: str,
+            param_types: Dict[str, Any],
+            param_values: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Request a single page from this AMM's subgraph
+
+        May raise RemoteError, after surfacing the error to the user the
+        way all the module's subgraph queries do.
+        """
+        try:
+            return self.graph.query(
+                querystr=querystr,
+                param_types=param_types,
+                param_values=param_values,
+            )
+        except RemoteError as e:
+            self.msg_aggregator.add_error(
+                SUBGRAPH_REMOTE_ERROR_MSG.format(error_msg=str(e), location=self.location),
+            )
+            raise
+
+    def _parse_events_graph_page(
+            self,
+            result_data: List[Dict[str, Any]],
+            address: ChecksumEthAddress,
+            event_type: EventType,
+            token_cache: Dict[ChecksumEthAddress, EthereumToken],
+    ) -> List[LiquidityPoolEvent]:
+        """Deserialize one page of subgraph mints or burns into events
+
+        May raise RemoteError if an address in the page can't be deserialized.
+        """
+        page_events: List[LiquidityPoolEvent] = []
+        for event in result_data:
+            token0_ = event['pair']['token0']
+            token1_ = event['pair']['token1']
+
+            try:
+                token0_deserialized = deserialize_ethereum_address_cached(token0_['id'])
+                token1_deserialized = deserialize_ethereum_address_cached(token1_['id'])
+                pool_deserialized = deserialize_ethereum_address_cached(event['pair']['id'])
+            except DeserializationError as e:
+                msg = (
+                    f'Failed to deserialize address involved in liquidity pool event for'
+                    f' {self.location}. Token 0: {token0_["id"]}, token 1: {token0_["id"]},'
+                    f' pair: {event["pair"]["id"]}.'
+                )
+                log.error(msg)
+                raise RemoteError(msg) from e
+
+            token0 = self._get_or_create_graph_token(
+                token_data=token0_,
+                token_address=token0_deserialized,
+                token_cache=token_cache,
+            )
+            token1 = self._get_or_create_graph_token(
+                token_data=token1_,
+                token_address=token1_deserialized,
+                token_cache=token_cache,
+            )
+            lp_event = LiquidityPoolEvent(
+                tx_hash=event['transaction']['id'],
+                log_index=int(event['logIndex']),
+                address=address,
+                timestamp=Timestamp(int(event['timestamp'])),
+                event_type=event_type,
+                pool_address=pool_deserialized,
+                token0=token0,
+                token1=token1,
+                amount0=AssetAmount(FVal(event['amount0'])),
+                amount1=AssetAmount(FVal(event['amount1'])),
+                usd_price=Price(FVal(event['amountUSD'])),
+                lp_amount=AssetAmount(FVal(event['liquidity'])),
+            )
+            page_events.append(lp_event)
+
+        return page_events
+
     def _get_events_graph(
             self,
             address: ChecksumEthAddress,
             start_ts: Timestamp,
             end_ts: Timestamp,
-            event_type: EventType,
     ) -> List[LiquidityPoolEvent]:
         """Get the address' events (mints & burns) querying the AMM's subgraph
+
+        Mints and burns are separate subgraph entities but are requested
+        together as one aliased operation, so every page round-trip covers
+        both. Each entity keeps its own pagination cursor and drops out of
+        the batch once its pages are exhausted.
         Each event data is stored in a <LiquidityPoolEvent>.
         """
         address_events: List[LiquidityPoolEvent] = []
-        if event_type == self.mint_event:
-            query = MINTS_QUERY
-            query_schema = 'mints'
-        elif event_type == self.burn_event:
-            query = BURNS_QUERY
-            query_schema = 'burns'
-        else:
-            log.error(
-                f'Unexpected {self.location} event_type: {event_type}. Skipping events query.',
-            )
-            return address_events
-
-        query_id = '0'
-        query_offset = 0
-        param_types = {
-            '$limit': 'Int!',
-            '$offset': 'Int!',
-            '$address': 'Bytes!',
-            '$start_ts': 'BigInt!',
-            '$end_ts': 'BigInt!',
-            '$id': 'ID!',
-        }
-        param_values = {
-            'limit': GRAPH_QUERY_LIMIT,
-            'offset': query_offset,
-            'address': address.lower(),
-            'start_ts': str(start_ts),
-            'end_ts': str(end_ts),
-            'id': query_id,
-        }
-        querystr = format_query_indentation(query.format())
-
-        while True:
-            try:
-                result = self.graph.query(
-                    querystr=querystr,
-                    param_types=param_types,
-                    param_values=param_values,
+        token_cache: Dict[ChecksumEthAddress, EthereumToken] = {}
+        # Pagination state per event type: a mutable [id cursor, offset] pair
+        streams = [
+            (self.mint_event, MINTS_QUERYSTR, ['0', 0]),
+            (self.burn_event, BURNS_QUERYSTR, ['0', 0]),
+        ]
+        while len(streams) != 0:
+            sub_queries = [
+                (
+                    querystr,
+                    EVENTS_PARAM_TYPES,
+                    {
+                        'limit': GRAPH_QUERY_LIMIT,
+                        'offset': state[1],
+                        'address': address.lower(),
+                        'start_ts': str(start_ts),
+                        'end_ts': str(end_ts),
+                        'id': state[0],
+                    },
                 )
+                for _, querystr, state in streams
+            ]
+            try:
+                results = self.graph.batch_query(sub_queries)
             except RemoteError as e:
                 self.msg_aggregator.add_error(
                     SUBGRAPH_REMOTE_ERROR_MSG.format(error_msg=str(e), location=self.location),
@@ -409,75 +552,123 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             except AttributeError as e:
                 raise ModuleInitializationFailure(f'{self.location} subgraph remote error') from e
 
-            result_data = result[query_schema]
-
-            for event in result_data:
-                token0_ = event['pair']['token0']
-                token1_ = event['pair']['token1']
-
-                try:
-                    token0_deserialized = deserialize_ethereum_address(token0_['id'])
-                    token1_deserialized = deserialize_ethereum_address(token1_['id'])
-                    pool_deserialized = deserialize_ethereum_address(event['pair']['id'])
-                except DeserializationError as e:
-                    msg = (
-                        f'Failed to deserialize address involved in liquidity pool event for'
-                        f' {self.location}. Token 0: {token0_["id"]}, token 1: {token0_["id"]},'
-                        f' pair: {event["pair"]["id"]}.'
-                    )
-                    log.error(msg)
-                    raise RemoteError(msg) from e
-
-                token0 = get_or_create_ethereum_token(
-                    userdb=self.database,
-                    symbol=token0_['symbol'],
-                    ethereum_address=token0_deserialized,
-                    name=token0_['name'],
-                    decimals=token0_['decimals'],
-                )
-                token1 = get_or_create_ethereum_token(
-                    userdb=self.database,
-                    symbol=token1_['symbol'],
-                    ethereum_address=token1_deserialized,
-                    name=token1_['name'],
-                    decimals=int(token1_['decimals']),
-                )
-                lp_event = LiquidityPoolEvent(
-                    tx_hash=event['transaction']['id'],
-                    log_index=int(event['logIndex']),
+            still_paginating = []
+            for (event_type, querystr, state), result_data in zip(streams, results):
+                address_events.extend(self._parse_events_graph_page(
+                    result_data=result_data,
                     address=address,
-                    timestamp=Timestamp(int(event['timestamp'])),
                     event_type=event_type,
-                    pool_address=pool_deserialized,
-                    token0=token0,
-                    token1=token1,
-                    amount0=AssetAmount(FVal(event['amount0'])),
-                    amount1=AssetAmount(FVal(event['amount1'])),
-                    usd_price=Price(FVal(event['amountUSD'])),
-                    lp_amount=AssetAmount(FVal(event['liquidity'])),
-                )
-                address_events.append(lp_event)
-                query_id = event['id']
+                    token_cache=token_cache,
+                ))
+                # Check whether an extra request is needed for this event type
+                if len(result_data) < GRAPH_QUERY_LIMIT:
+                    continue
 
-            # Check whether an extra request is needed
-            if len(result_data) < GRAPH_QUERY_LIMIT:
-                break
+                if state[1] == GRAPH_QUERY_SKIP_LIMIT:
+                    state[0] = result_data[-1]['id']
+                    state[1] = 0
+                else:
+                    state[0] = '0'
+                    state[1] += GRAPH_QUERY_LIMIT
+                still_paginating.append((event_type, querystr, state))
 
-            # Update pagination step
-            if query_offset == GRAPH_QUERY_SKIP_LIMIT:
-                query_offset = 0
-                new_query_id = query_id
-            else:
-                query_offset += GRAPH_QUERY_LIMIT
-                new_query_id = '0'
-            param_values = {
-                **param_values,
-                'id': new_query_id,
-                'offset': query_offset,
-            }
+            streams = still_paginating
 
         return address_events
 
+    def _query_events_graph_concurrently(
+            self,
+            addresses: List[ChecksumEthAddress],
+            start_ts: Timestamp,
+            end_ts: Timestamp,
+            address_events: DDAddressEvents,
+    ) -> None:
+        """Query the events of every address concurrently
+
+        Each address is a blocking subgraph request, so they are dispatched
+        in parallel greenlets and gathered into `address_events` once all of
+        them are done. Wall time becomes roughly one round-trip instead of
+        one per address.
+        """
+        greenlets = [
+            gevent.spawn(self._get_events_graph, address, start_ts, end_ts)
+            for address in addresses
+        ]
+        gevent.joinall(greenlets)
+        for address, greenlet in zip(addresses, greenlets):
+            events = greenlet.get()  # re-raises if the query errored
+            if events:
+                address_events[address].extend(events)
+
+    def _deserialize_swap_from_graph(
+            self,
+            swap: Dict[str, Any],
+            address: ChecksumEthAddress,
+            token_cache: Dict[ChecksumEthAddress, EthereumToken],
+    ) -> Optional[AMMSwap]:
+        """Turn one subgraph swap entry into an <AMMSwap>
+
+        Returns None, after logging, for swaps whose addresses or amounts
+        can't be deserialized. May raise KeyError if the swap entry is
+        missing expected keys.
+        """
+        timestamp = swap['timestamp']
+        swap_token0 = swap['pair']['token0']
+        swap_token1 = swap['pair']['token1']
+
+        try:
+            token0_deserialized = deserialize_ethereum_address_cached(swap_token0['id'])
+            token1_deserialized = deserialize_ethereum_address_cached(swap_token1['id'])
+            from_address_deserialized = deserialize_ethereum_address_cached(swap['sender'])
+            to_address_deserialized = deserialize_ethereum_address_cached(swap['to'])
+        except DeserializationError:
+            msg = (
+                f'Failed to deserialize addresses in trade from {self.location} graph'
+                f' with token 0: {swap_token0["id"]}, token 1: {swap_token1["id"]}, '
+                f'swap sender: {swap["sender"]}, swap receiver {swap["to"]}'
+            )
+            log.error(msg)
+            return None
+
+        token0 = self._get_or_create_graph_token(
+            token_data=swap_token0,
+            token_address=token0_deserialized,
+            token_cache=token_cache,
+        )
+        token1 = self._get_or_create_graph_token(
+            token_data=swap_token1,
+            token_address=token1_deserialized,
+            token_cache=token_cache,
+        )
+
+        try:
+            amount0_in = FVal(swap['amount0In'])
+            amount1_in = FVal(swap['amount1In'])
+            amount0_out = FVal(swap['amount0Out'])
+            amount1_out = FVal(swap['amount1Out'])
+        except ValueError as e:
+            log.error(
+                f'Failed to read amounts in {self.location} swap {str(swap)}. '
+                f'{str(e)}.',
+            )
+            return None
+
+        return AMMSwap(
+            tx_hash=swap['id'].split('-')[0],
+            log_index=int(swap['logIndex']),
+            address=address,
+            from_address=from_address_deserialized,
+            to_address=to_address_deserialized,
+            timestamp=Timestamp(int(timestamp)),
+            location=self.location,
+            token0=token0,
+            token1=token1,
+            amount0_in=AssetAmount(amount0_in),
+            amount1_in=AssetAmount(amount1_in),
+            amount0_out=AssetAmount(amount0_out),
+            amount1_out=AssetAmount(amount1_out),
+        )
+
     def _read_subgraph_trades(
             self,
             address: ChecksumEthAddress,
@@ -505,14 +696,6 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
         trades: List[AMMTrade] = []
         query_id = '0'
         query_offset = 0
-        param_types = {
-            '$limit': 'Int!',
-            '$offset': 'Int!',
-            '$address': 'Bytes!',
-            '$start_ts': 'BigInt!',
-            '$end_ts': 'BigInt!',
-            '$id': 'ID!',
-        }
         param_values = {
             'limit': GRAPH_QUERY_LIMIT,
             'offset': 0,
@@ -521,85 +704,41 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             'end_ts': str(end_ts),
             'id': query_id,
         }
-        querystr = format_query_indentation(self.swaps_query.format())
+        querystr = self.swaps_querystr
+        token_cache: Dict[ChecksumEthAddress, EthereumToken] = {}
 
+        result = self._query_graph_page(querystr, SWAPS_PARAM_TYPES, param_values)
         while True:
-            try:
-                result = self.graph.query(
-                    querystr=querystr,
-                    param_types=param_types,
-                    param_values=param_values,
-                )
-            except RemoteError as e:
-                self.msg_aggregator.add_error(
-                    SUBGRAPH_REMOTE_ERROR_MSG.format(error_msg=str(e), location=self.location),
+            result_data = result['swaps']
+            # Start fetching the next page before parsing this one, so the
+            # network round-trip overlaps with the parsing work. Not possible
+            # right at the skip limit, where the id cursor for the next page
+            # only becomes known while parsing the current rows
+            next_page = None
+            if len(result_data) == GRAPH_QUERY_LIMIT and query_offset != GRAPH_QUERY_SKIP_LIMIT:
+                # mutated in place: the previous page's request has already
+                # been fully sent by the time this runs, so nothing else
+                # holds the dict
+                query_offset += GRAPH_QUERY_LIMIT
+                param_values['id'] = '0'
+                param_values['offset'] = query_offset
+                next_page = gevent.spawn(
+                    self._query_graph_page,
+                    querystr,
+                    SWAPS_PARAM_TYPES,
+                    param_values,
                 )
-                raise
 
-            for entry in result['swaps']:
-                swaps = []
+            for entry in result_data:
                 try:
-                    for swap in entry['transaction']['swaps']:
-                        timestamp = swap['timestamp']
-                        swap_token0 = swap['pair']['token0']
-                        swap_token1 = swap['pair']['token1']
-
-                        try:
-                            token0_deserialized = deserialize_ethereum_address(swap_token0['id'])
-                            token1_deserialized = deserialize_ethereum_address(swap_token1['id'])
-                            from_address_deserialized = deserialize_ethereum_address(swap['sender'])  # noqa
-                            to_address_deserialized = deserialize_ethereum_address(swap['to'])
-                        except DeserializationError:
-                            msg = (
-                                f'Failed to deserialize addresses in trade from {self.location} graph'  # noqa
-                                f' with token 0: {swap_token0["id"]}, token 1: {swap_token1["id"]}, '  # noqa
-                                f'swap sender: {swap["sender"]}, swap receiver {swap["to"]}'
-                            )
-                            log.error(msg)
-                            continue
-
-                        token0 = get_or_create_ethereum_token(
-                            userdb=self.database,
-                            symbol=swap_token0['symbol'],
-                            ethereum_address=token0_deserialized,
-                            name=swap_token0['name'],
-                            decimals=swap_token0['decimals'],
-                        )
-                        token1 = get_or_create_ethereum_token(
-                            userdb=self.database,
-                            symbol=swap_token1['symbol'],
-                            ethereum_address=token1_deserialized,
-                            name=swap_token1['name'],
-                            decimals=int(swap_token1['decimals']),
-                        )
-
-                        try:
-                            amount0_in = FVal(swap['amount0In'])
-                            amount1_in = FVal(swap['amount1In'])
-                            amount0_out = FVal(swap['amount0Out'])
-                            amount1_out = FVal(swap['amount1Out'])
-                        except ValueError as e:
-                            log.error(
-                                f'Failed to read amounts in {self.location} swap {str(swap)}. '
-                                f'{str(e)}.',
-                            )
-                            continue
-
-                        swaps.append(AMMSwap(
-                            tx_hash=swap['id'].split('-')[0],
-                            log_index=int(swap['logIndex']),
+                    maybe_swaps = [
+                        self._deserialize_swap_from_graph(
+                            swap=swap,
                             address=address,
-                            from_address=from_address_deserialized,
-                            to_address=to_address_deserialized,
-                            timestamp=Timestamp(int(timestamp)),
-                            location=self.location,
-                            token0=token0,
-                            token1=token1,
-                            amount0_in=AssetAmount(amount0_in),
-                            amount1_in=AssetAmount(amount1_in),
-                            amount0_out=AssetAmount(amount0_out),
-                            amount1_out=AssetAmount(amount1_out),
-                        ))
+                            token_cache=token_cache,
+                        )
+                        for swap in entry['transaction']['swaps']
+                    ]
                     query_id = entry['id']
                 except KeyError as e:
                     log.error(
@@ -608,8 +747,10 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
                     )
                     continue
 
-                # with the new logic the list of swaps can be empty, in that case don't try
+                # swaps that failed to deserialize are None, and with the new
+                # logic the list of swaps can be empty, in that case don't try
                 # to make trades from the swaps
+                swaps = [swap for swap in maybe_swaps if swap is not None]
                 if len(swaps) == 0:
                     continue
 
@@ -617,21 +758,17 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
                 trades.extend(self._tx_swaps_to_trades(swaps))
 
             # Check whether an extra request is needed
-            if len(result['swaps']) < GRAPH_QUERY_LIMIT:
+            if len(result_data) < GRAPH_QUERY_LIMIT:
                 break
 
-            # Update pagination step
-            if query_offset == GRAPH_QUERY_SKIP_LIMIT:
-                query_offset = 0
-                new_query_id = query_id
+            if next_page is not None:
+                result = next_page.get()  # re-raises if the prefetch errored
             else:
-                query_offset += GRAPH_QUERY_LIMIT
-                new_query_id = '0'
-            param_values = {
-                **param_values,
-                'id': new_query_id,
-                'offset': query_offset,
-            }
+                # Skip limit reached: restart from offset 0 with the id cursor
+                query_offset = 0
+                param_values['id'] = query_id
+                param_values['offset'] = query_offset
+                result = self._query_graph_page(querystr, SWAPS_PARAM_TYPES, param_values)
 
         return trades
 
@@ -641,9 +778,20 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             start_ts: Timestamp,
             end_ts: Timestamp,
     ) -> AddressTrades:
+        """Query the subgraph trades of all addresses concurrently
+
+        The per-address queries are network bound, so dispatching them in
+        parallel greenlets costs roughly one round-trip of wall time instead
+        of one per address.
+        """
+        greenlets = [
+            gevent.spawn(self._get_trades_graph_for_address, address, start_ts, end_ts)
+            for address in addresses
+        ]
+        gevent.joinall(greenlets)
         address_trades = {}
-        for address in addresses:
-            trades = self._get_trades_graph_for_address(address, start_ts, end_ts)
+        for address, greenlet in zip(addresses, greenlets):
+            trades = greenlet.get()  # re-raises if the query errored
             if len(trades) != 0:
                 address_trades[address] = trades
 
@@ -668,14 +816,19 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
         if only_cache:
             return self._fetch_trades_from_db(addresses, from_timestamp, to_timestamp)
 
-        dbranges = DBQueryRanges(self.database)
-        # Get addresses' last used query range for this AMM's trades
+        # Get all addresses' last used query range for this AMM's trades at once
+        used_ranges = self.database.get_used_query_ranges(
+            names=[f'{self.trades_prefix}_{address}' for address in addresses],
+        )
         for address in addresses:
-            entry_name = f'{self.trades_prefix}_{address}'
-            trades_range = self.database.get_used_query_range(name=entry_name)
+            trades_range = used_ranges.get(f'{self.trades_prefix}_{address}')
 
             if not trades_range:
                 new_addresses.append(address)
+            elif trades_range[1] >= to_timestamp:
+                # The saved range already covers the requested period, so the
+                # address needs no subgraph requests at all
+                continue
             else:
                 existing_addresses.append(address)
                 min_end_ts = min(min_end_ts, trades_range[1])
@@ -690,13 +843,11 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             )
             address_amm_trades.update(new_address_trades)
 
-            # Insert last used query range for new addresses
-            for address in new_addresses:
-                entry_name = f'{self.trades_prefix}_{address}'
-                dbranges.update_used_query_range(
-                    location_string=entry_name,
-                    queried_ranges=[(start_ts, to_timestamp)],
-                )
+            # Insert last used query range for new addresses in one write
+            self.database.update_used_query_ranges([
+                (f'{self.trades_prefix}_{address}', start_ts, to_timestamp)
+                for address in new_addresses
+            ])
 
         # Request existing DB addresses' trades
         if existing_addresses and to_timestamp > min_end_ts:
@@ -707,22 +858,30 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             )
             address_amm_trades.update(address_new_trades)
 
-            # Update last used query range for existing addresses
+            # Update last used query range for existing addresses in one
+            # write, merging in each address' saved range the same way
+            # DBQueryRanges.update_used_query_range would
+            range_entries = []
             for address in existing_addresses:
                 entry_name = f'{self.trades_prefix}_{address}'
-                dbranges.update_used_query_range(
-                    location_string=entry_name,
-                    queried_ranges=[(min_end_ts, to_timestamp)],
-                )
-
-        # Insert all unique swaps to the DB
-        all_swaps = set()
-        for address in filter(lambda x: x in address_amm_trades, addresses):
-            for trade in address_amm_trades[address]:
-                for swap in trade.swaps:
-                    all_swaps.add(swap)
-
-        self.database.add_amm_swaps(list(all_swaps))
+                saved_range = used_ranges[entry_name]
+                range_entries.append((
+                    entry_name,
+                    min(min_end_ts, saved_range[0]),
+                    max(to_timestamp, saved_range[1]),
+                ))
+            self.database.update_used_query_ranges(range_entries)
+
+        # Insert all unique swaps to the DB, deduplicated on the identity key
+        # directly so only a two-field tuple is hashed per swap
+        unique_swaps = {
+            (swap.tx_hash, swap.log_index): swap
+            for address in addresses
+            if address in address_amm_trades
+            for trade in address_amm_trades[address]
+            for swap in trade.swaps
+        }
+        self.database.add_amm_swaps(list(unique_swaps.values()))
         return self._fetch_trades_from_db(addresses, from_timestamp, to_timestamp)
 
     def _get_unknown_asset_price_graph(
@@ -736,43 +895,55 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
         """
         asset_price: AssetToPrice = {}
 
-        unknown_assets_addresses = (
-            [asset.ethereum_address.lower() for asset in unknown_assets]
-        )
-        querystr = format_query_indentation(TOKEN_DAY_DATAS_QUERY.format())
         today_epoch = int(
             datetime.combine(datetime.utcnow().date(), time.min).timestamp(),
         )
-        param_types = {
-            '$limit': 'Int!',
-            '$offset': 'Int!',
-            '$token_ids': '[String!]',
-            '$datetime': 'Int!',
-        }
-        param_values = {
+        if today_epoch != self._price_cache_epoch:
+            self._price_cache_epoch = today_epoch
+            self._price_cache.clear()
+
+        # Serve tokens already priced today from the memo and only query the rest
+        uncached_assets = []
+        for asset in unknown_assets:
+            cached_price = self._price_cache.get(asset.ethereum_address)
+            if cached_price is not None:
+                asset_price[asset.ethereum_address] = cached_price
+            else:
+                uncached_assets.append(asset)
+
+        if len(uncached_assets) == 0:
+            return asset_price
+
+        unknown_assets_addresses = (
+            [asset.ethereum_address.lower() for asset in uncached_assets]
+        )
+        querystr = TOKEN_DAY_DATAS_QUERYSTR
+        param_values: Dict[str, Any] = {
             'limit': GRAPH_QUERY_LIMIT,
             'offset': 0,
             'token_ids': unknown_assets_addresses,
             'datetime': today_epoch,
         }
+        result = self._query_graph_page(querystr, TOKEN_DAY_DATAS_PARAM_TYPES, param_values)
         while True:
-            try:
-                result = self.graph.query(
-                    querystr=querystr,
-                    param_types=param_types,
-                    param_values=param_values,
-                )
-            except RemoteError as e:
-                self.msg_aggregator.add_error(
-                    SUBGRAPH_REMOTE_ERROR_MSG.format(error_msg=str(e), location=self.location),
-                )
-                raise
-
             result_data = result['tokenDayDatas']
+            # Start fetching the next page before parsing this one, so the
+            # network round-trip overlaps with the parsing work
+            next_page = None
+            if len(result_data) == GRAPH_QUERY_LIMIT:
+                # mutated in place: the previous page's request has already
+                # been fully sent by the time this runs
+                param_values['offset'] += GRAPH_QUERY_LIMIT
+                next_page = gevent.spawn(
+                    self._query_graph_page,
+                    querystr,
+                    TOKEN_DAY_DATAS_PARAM_TYPES,
+                    param_values,
+                )
 
             for tdd in result_data:
                 try:
-                    token_address = deserialize_ethereum_address(tdd['token']['id'])
+                    token_address = deserialize_ethereum_address_cached(tdd['token']['id'])
                 except DeserializationError as e:
                     msg = (
                         f'Error deserializing address {tdd["token"]["id"]} '
@@ -780,17 +951,13 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
                     )
                     log.error(msg)
                     raise RemoteError(msg) from e
-                asset_price[token_address] = Price(FVal(tdd['priceUSD']))
+                price = Price(FVal(tdd['priceUSD']))
+                asset_price[token_address] = price
+                self._price_cache[token_address] = price
 
-            # Check whether an extra request is needed
-            if len(result_data) < GRAPH_QUERY_LIMIT:
+            if next_page is None:  # this page was the last one
                 break
-
-            # Update pagination step
-            param_values = {
-                **param_values,
-                'offset': param_values['offset'] + GRAPH_QUERY_LIMIT,  # type: ignore
-            }
+            result = next_page.get()  # re-raises if the prefetch errored
 
         return asset_price
 
@@ -858,6 +1025,47 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
 
         return db_address_trades
 
+    def _deserialize_pool_asset_from_graph(
+            self,
+            token: Dict[str, Any],
+            user_lp_share: FVal,
+            token_cache: Dict[ChecksumEthAddress, EthereumToken],
+            known_assets: Set[EthereumToken],
+            unknown_assets: Set[EthereumToken],
+    ) -> LiquidityPoolAsset:
+        """Turn one subgraph pool token entry into a <LiquidityPoolAsset>
+
+        Classifies the asset as price known or unknown on the way.
+        May raise RemoteError if the token address can't be deserialized.
+        """
+        try:
+            deserialized_eth_address = deserialize_ethereum_address_cached(token['id'])
+        except DeserializationError as e:
+            msg = (
+                f'Failed to deserialize token address {token["id"]} '
+                f'Bad token address in {self.location} lp pair came from the graph.'
+            )
+            log.error(msg)
+            raise RemoteError(msg) from e
+
+        asset = self._get_or_create_graph_token(
+            token_data=token,
+            token_address=deserialized_eth_address,
+            token_cache=token_cache,
+        )
+        if asset.has_oracle():
+            known_assets.add(asset)
+        else:
+            unknown_assets.add(asset)
+
+        # Estimate the underlying asset total_amount
+        asset_total_amount = FVal(token['total_amount'])
+        return LiquidityPoolAsset(
+            asset=asset,
+            total_amount=asset_total_amount,
+            user_balance=Balance(amount=user_lp_share * asset_total_amount),
+        )
+
     def _get_balances_graph(
             self,
             addresses: List[ChecksumEthAddress],
@@ -871,16 +1079,10 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
         unknown_assets: Set[EthereumToken] = set()
 
         addresses_lower = [address.lower() for address in addresses]
-        querystr = format_query_indentation(LIQUIDITY_POSITIONS_QUERY.format())
+        querystr = LIQUIDITY_POSITIONS_QUERYSTR
+        token_cache: Dict[ChecksumEthAddress, EthereumToken] = {}
         query_id = '0'
         query_offset = 0
-        param_types = {
-            '$limit': 'Int!',
-            '$offset': 'Int!',
-            '$addresses': '[String!]',
-            '$balance': 'BigDecimal!',
-            '$id': 'ID!',
-        }
         param_values = {
             'limit': GRAPH_QUERY_LIMIT,
             'offset': 0,
@@ -888,30 +1090,35 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             'balance': '0',
             'id': query_id,
         }
+        result = self._query_graph_page(querystr, LIQUIDITY_POSITIONS_PARAM_TYPES, param_values)
         while True:
-            try:
-                result = self.graph.query(
-                    querystr=querystr,
-                    param_types=param_types,
-                    param_values=param_values,
-                )
-            except RemoteError as e:
-                self.msg_aggregator.add_error(
-                    SUBGRAPH_REMOTE_ERROR_MSG.format(
-                        error_msg=str(e),
-                        location=self.location,
-                    ),
+            result_data = result['liquidityPositions']
+            # Start fetching the next page before parsing this one, so the
+            # network round-trip overlaps with the parsing work. Not possible
+            # right at the skip limit, where the id cursor for the next page
+            # only becomes known while parsing the current rows
+            next_page = None
+            if len(result_data) == GRAPH_QUERY_LIMIT and query_offset != GRAPH_QUERY_SKIP_LIMIT:
+                # mutated in place: the previous page's request has already
+                # been fully sent by the time this runs, so nothing else
+                # holds the dict
+                query_offset += GRAPH_QUERY_LIMIT
+                param_values['id'] = '0'
+                param_values['offset'] = query_offset
+                next_page = gevent.spawn(
+                    self._query_graph_page,
+                    querystr,
+                    LIQUIDITY_POSITIONS_PARAM_TYPES,
+                    param_values,
                 )
-                raise
 
-            result_data = result['liquidityPositions']
             for lp in result_data:
                 lp_pair = lp['pair']
                 lp_total_supply = FVal(lp_pair['totalSupply'])
                 user_lp_balance = FVal(lp['liquidityTokenBalance'])
                 try:
-                    user_address = deserialize_ethereum_address(lp['user']['id'])
-                    lp_address = deserialize_ethereum_address(lp_pair['id'])
+                    user_address = deserialize_ethereum_address_cached(lp['user']['id'])
+                    lp_address = deserialize_ethereum_address_cached(lp_pair['id'])
                 except DeserializationError as e:
                     msg = (
                         f'Failed to Deserialize address. Skipping {self.location} '
@@ -926,42 +1133,19 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
                 token1 = lp_pair['token1']
                 token1['total_amount'] = lp_pair['reserve1']
 
-                liquidity_pool_assets = []
-                for token in token0, token1:
-                    try:
-                        deserialized_eth_address = deserialize_ethereum_address(token['id'])
-                    except DeserializationError as e:
-                        msg = (
-                            f'Failed to deserialize token address {token["id"]} '
-                            f'Bad token address in {self.location} lp pair came from the graph.'
-                        )
-                        log.error(msg)
-                        raise RemoteError(msg) from e
-
-                    asset = get_or_create_ethereum_token(
-                        userdb=self.database,
-                        symbol=token['symbol'],
-                        ethereum_address=deserialized_eth_address,
-                        name=token['name'],
-                        decimals=int(token['decimals']),
-                    )
-                    if asset.has_oracle():
-                        known_assets.add(asset)
-                    else:
-                        unknown_assets.add(asset)
-
-                    # Estimate the underlying asset total_amount
-                    asset_total_amount = FVal(token['total_amount'])
-                    user_asset_balance = (
-                        user_lp_balance / lp_total_supply * asset_total_amount
-                    )
-
-                    liquidity_pool_asset = LiquidityPoolAsset(
-                        asset=asset,
-                        total_amount=asset_total_amount,
-                        user_balance=Balance(amount=user_asset_balance),
+                # The user's share of the pool is the same for both tokens, so
+                # do the decimal division once per position instead of per token
+                user_lp_share = user_lp_balance / lp_total_supply
+                liquidity_pool_assets = [
+                    self._deserialize_pool_asset_from_graph(
+                        token=token,
+                        user_lp_share=user_lp_share,
+                        token_cache=token_cache,
+                        known_assets=known_assets,
+                        unknown_assets=unknown_assets,
                     )
-                    liquidity_pool_assets.append(liquidity_pool_asset)
+                    for token in (token0, token1)
+                ]
 
                 liquidity_pool = LiquidityPool(
                     address=lp_address,
@@ -976,18 +1160,18 @@ class AMMSwapPlatform(metaclass=abc.ABCMeta):
             if len(result_data) < GRAPH_QUERY_LIMIT:
                 break
 
-            # Update pagination step
-            if query_offset == GRAPH_QUERY_SKIP_LIMIT:
-                query_offset = 0
-                new_query_id = query_id
+            if next_page is not None:
+                result = next_page.get()  # re-raises if the prefetch errored
             else:
-                query_offset += GRAPH_QUERY_LIMIT
-                new_query_id = '0'
-            param_values = {
-                **param_values,
-                'id': new_query_id,
-                'offset': query_offset,
-            }
+                # Skip limit reached: restart from offset 0 with the id cursor
+                query_offset = 0
+                param_values['id'] = query_id
+                param_values['offset'] = query_offset
+                result = self._query_graph_page(
+                    querystr,
+                    LIQUIDITY_POSITIONS_PARAM_TYPES,
+                    param_values,
+                )
 
         protocol_balance = ProtocolBalance(
             address_balances=dict(address_balances),
@@ -32,11 +32,13 @@ class LiquidityPoolAsset:
     usd_price: Price = Price(ZERO)
 
     def serialize(self) -> Dict[str, Any]:
+        # Stringify the FVals here so the payload is made of json builtins and
+        # the encoder does not have to fall back to its python default() hook
         return {
             'asset': self.asset.serialize(),
-            'total_amount': self.total_amount,
+            'total_amount': str(self.total_amount) if self.total_amount is not None else None,
             'user_balance': self.user_balance.serialize(),
-            'usd_price': self.usd_price,
+            'usd_price': str(self.usd_price),
         }
 
 
@@ -51,7 +53,7 @@ class LiquidityPool:
         return {
             'address': self.address,
             'assets': [asset.serialize() for asset in self.assets],
-            'total_supply': self.total_supply,
+            'total_supply': str(self.total_supply) if self.total_supply is not None else None,
             'user_balance': self.user_balance.serialize(),
         }
 
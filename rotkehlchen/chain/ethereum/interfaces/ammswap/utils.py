@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 from typing import TYPE_CHECKING, NamedTuple, Set, Tuple
 
 from rotkehlchen.accounting.structures.balance import Balance
@@ -7,6 +8,7 @@ from rotkehlchen.assets.utils import get_or_create_ethereum_token
 from rotkehlchen.chain.ethereum.utils import token_normalized_value_decimals
 from rotkehlchen.fval import FVal
 from rotkehlchen.logging import RotkehlchenLogsAdapter
+from rotkehlchen.serialization.deserialize import deserialize_ethereum_address
 from rotkehlchen.types import ChecksumEthAddress
 
 from .types import LiquidityPool, LiquidityPoolAsset
@@ -26,6 +28,19 @@ SUBGRAPH_REMOTE_ERROR_MSG = (
 )
 
 
+@lru_cache(maxsize=8192)
+def deserialize_ethereum_address_cached(address: str) -> ChecksumEthAddress:
+    """deserialize_ethereum_address memoized on the raw address string
+
+    Checksumming an address involves a keccak hash and the subgraphs repeat
+    the same few pool/token/participant addresses thousands of times per
+    query, so the hash is paid once per distinct address instead. A raised
+    DeserializationError is not cached, so failures behave exactly like the
+    plain call.
+    """
+    return deserialize_ethereum_address(address)
+
+
 class TokenDetails(NamedTuple):
     address: ChecksumEthAddress
     name: str
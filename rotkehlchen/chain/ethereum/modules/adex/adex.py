@@ -51,6 +51,7 @@ from .types import (
     DeserializationMethod,
     Unbond,
     UnbondRequest,
+    make_adex_event_core,
 )
 from .utils import (
     ADEX_EVENTS_PREFIX,
@@ -69,6 +70,14 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 log = RotkehlchenLogsAdapter(logger)
 
+# Subgraph query and response schema per queried event type
+EVENT_TYPE_QUERY_SCHEMA: Dict[AdexEventType, Any] = {
+    AdexEventType.BOND: (BONDS_QUERY, 'bonds'),
+    AdexEventType.UNBOND: (UNBONDS_QUERY, 'unbonds'),
+    AdexEventType.UNBOND_REQUEST: (UNBOND_REQUESTS_QUERY, 'unbondRequests'),
+    AdexEventType.CHANNEL_WITHDRAW: (CHANNEL_WITHDRAWS_QUERY, 'channelWithdraws'),
+}
+
 
 class Adex(EthereumModule):
     """AdEx integration module
@@ -101,6 +110,14 @@ class Adex(EthereumModule):
             )
             raise ModuleInitializationFailure('subgraph remote error') from e
 
+        # O(1) dispatch instead of an if/elif chain per queried event type
+        self.deserialization_methods: Dict[AdexEventType, DeserializationMethod] = {
+            AdexEventType.BOND: self._deserialize_bond,
+            AdexEventType.UNBOND: self._deserialize_unbond,
+            AdexEventType.UNBOND_REQUEST: self._deserialize_unbond_request,
+            AdexEventType.CHANNEL_WITHDRAW: self._deserialize_channel_withdraw,
+        }
+
     @staticmethod
     def _get_staking_history(
             staking_balances: Dict[ChecksumAddress, List[Dict[str, Any]]],
@@ -118,16 +135,16 @@ class Adex(EthereumModule):
         staking_history = {}
         address_staking_events = defaultdict(list)
         all_events = staking_events.get_all()
+        # Sort all events once by timestamp (older first) and event type. The
+        # grouping below preserves that order, which saves a re-sort of every
+        # per-address list over the same data
+        all_events.sort(
+            key=lambda event: (event.timestamp, EVENT_TYPE_ORDER_IN_ASC[type(event)]),
+        )
         # Map addresses with their events
         for event in all_events:
             address_staking_events[event.address].append(event)
 
-        # Sort staking events per address by timestamp (older first) and event type
-        for address in address_staking_events.keys():
-            address_staking_events[address].sort(
-                key=lambda event: (event.timestamp, EVENT_TYPE_ORDER_IN_ASC[type(event)]),
-            )
-
         for address, adx_staking_balances in staking_balances.items():
             adx_staking_details = []
             for adx_staking_balance in adx_staking_balances:
@@ -367,7 +384,7 @@ class Adex(EthereumModule):
 
         timestamp = deserialize_timestamp(raw_event['timestamp'])
 
-        return AdexEvent(
+        return make_adex_event_core(
             tx_hash=tx_hash,
             address=address,
             identity_address=identity_address,
@@ -412,6 +429,7 @@ class Adex(EthereumModule):
             timestamp=adex_event.timestamp,
             bond_id=bond_id,
             value=Balance(),
+            pool_id='',  # updated later via its bond
         )
 
     def _deserialize_unbond_request(
@@ -454,6 +472,7 @@ class Adex(EthereumModule):
             bond_id=bond_id,
             value=Balance(),
             unlock_at=unlock_at,
+            pool_id='',  # updated later via its bond
         )
 
     def _get_staking_events(
@@ -590,32 +609,17 @@ class Adex(EthereumModule):
         events on the subgraph response.
         - RemoteError: when there is a problem querying the subgraph.
         """
-        user_identities = [str(identity).lower() for identity in identity_address_map.keys()]
-        deserialization_method: DeserializationMethod
-        querystr: str
-        schema: Literal['bonds', 'unbonds', 'unbondRequests', 'channelWithdraws']
-        if event_type == AdexEventType.BOND:
-            queried_addresses = user_identities
-            deserialization_method = self._deserialize_bond
-            querystr = format_query_indentation(BONDS_QUERY.format())
-            schema = 'bonds'
-        elif event_type == AdexEventType.UNBOND:
-            queried_addresses = user_identities
-            deserialization_method = self._deserialize_unbond
-            querystr = format_query_indentation(UNBONDS_QUERY.format())
-            schema = 'unbonds'
-        elif event_type == AdexEventType.UNBOND_REQUEST:
-            queried_addresses = user_identities
-            deserialization_method = self._deserialize_unbond_request
-            querystr = format_query_indentation(UNBOND_REQUESTS_QUERY.format())
-            schema = 'unbondRequests'
-        elif event_type == AdexEventType.CHANNEL_WITHDRAW:
+        try:
+            query, schema = EVENT_TYPE_QUERY_SCHEMA[event_type]
+            deserialization_method = self.deserialization_methods[event_type]
+        except KeyError as e:
+            raise AssertionError(f'Unexpected AdEx event type: {event_type}.') from e
+
+        if event_type == AdexEventType.CHANNEL_WITHDRAW:
             queried_addresses = [address.lower() for address in addresses]
-            deserialization_method = self._deserialize_channel_withdraw
-            querystr = format_query_indentation(CHANNEL_WITHDRAWS_QUERY.format())
-            schema = 'channelWithdraws'
         else:
-            raise AssertionError(f'Unexpected AdEx event type: {event_type}.')
+            queried_addresses = [str(identity).lower() for identity in identity_address_map.keys()]
+        querystr = format_query_indentation(query.format())
 
         start_ts = from_timestamp or 0
         end_ts = to_timestamp or ts_now()
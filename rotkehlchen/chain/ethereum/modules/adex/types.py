@@ -1,19 +1,40 @@
+from __future__ import annotations
+
+import operator
+import sys
 from dataclasses import dataclass
-from enum import Enum
-from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from enum import IntEnum
+from functools import lru_cache
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
-from eth_typing import ChecksumAddress
+if TYPE_CHECKING:
+    from eth_typing import ChecksumAddress
 
-from rotkehlchen.accounting.structures.balance import Balance
-from rotkehlchen.assets.asset import EthereumToken
-from rotkehlchen.fval import FVal
-from rotkehlchen.types import Timestamp
+    from rotkehlchen.accounting.structures.balance import Balance
+    from rotkehlchen.assets.asset import EthereumToken
+    from rotkehlchen.fval import FVal
+    from rotkehlchen.types import Timestamp
 
 # Pools data
-TOM_POOL_ID = '0x2ce0c96383fb229d9776f33846e983a956a7d95844fac57b180ed0071d93bb28'
-POOL_ID_POOL_NAME = {
-    TOM_POOL_ID: 'Tom',
-}
+# interned so that dict probes against it compare by identity first
+TOM_POOL_ID = sys.intern('0x2ce0c96383fb229d9776f33846e983a956a7d95844fac57b180ed0071d93bb28')
+_TOM_POOL_NAME = 'Tom'
+# read-only view so nothing can grow it behind the back of the serializers,
+# which special-case the single known pool id below
+POOL_ID_POOL_NAME = MappingProxyType({
+    TOM_POOL_ID: _TOM_POOL_NAME,
+})
 
 AdexEventDBTuple = (
     Tuple[
@@ -36,7 +57,7 @@ AdexEventDBTuple = (
 )
 
 
-class AdexEventType(Enum):
+class AdexEventType(IntEnum):
     """Supported events"""
     BOND = 1
     UNBOND = 2
@@ -44,19 +65,87 @@ class AdexEventType(Enum):
     CHANNEL_WITHDRAW = 4
 
     def __str__(self) -> str:
-        if self == AdexEventType.BOND:
-            return 'deposit'
-        if self == AdexEventType.UNBOND:
-            return 'withdraw'
-        if self == AdexEventType.UNBOND_REQUEST:
-            return 'withdraw request'
-        if self == AdexEventType.CHANNEL_WITHDRAW:
-            return 'claim'
-        raise AssertionError(f'Corrupt value {self} for EventType -- Should never happen')
+        try:
+            return EVENT_TYPE_STR[self]
+        except KeyError as e:
+            raise AssertionError(
+                f'Corrupt value {self} for EventType -- Should never happen',
+            ) from e
+
+
+# Serialized forms of each event type, precomputed once at import since stringifying
+# the enum per event showed up in serialization of big staking histories
+EVENT_TYPE_STR = {
+    AdexEventType.BOND: 'deposit',
+    AdexEventType.UNBOND: 'withdraw',
+    AdexEventType.UNBOND_REQUEST: 'withdraw request',
+    AdexEventType.CHANNEL_WITHDRAW: 'claim',
+}
+_BOND_STR = EVENT_TYPE_STR[AdexEventType.BOND]
+_UNBOND_STR = EVENT_TYPE_STR[AdexEventType.UNBOND]
+_UNBOND_REQUEST_STR = EVENT_TYPE_STR[AdexEventType.UNBOND_REQUEST]
+_CHANNEL_WITHDRAW_STR = EVENT_TYPE_STR[AdexEventType.CHANNEL_WITHDRAW]
+
+# Per-event-type serialize() templates. dict.copy() of a presized dict re-inserts
+# already hashed keys in C, which beats rebuilding the dict display per event and
+# also bakes in the constant event_type entry
+_BOND_SERIALIZE_TEMPLATE: Dict[str, Any] = {
+    'tx_hash': None,
+    'identity_address': None,
+    'timestamp': None,
+    'bond_id': None,
+    'pool_id': None,
+    'pool_name': None,
+    'value': None,
+    'event_type': _BOND_STR,
+}
+_UNBOND_SERIALIZE_TEMPLATE: Dict[str, Any] = {
+    **_BOND_SERIALIZE_TEMPLATE,
+    'event_type': _UNBOND_STR,
+}
+_UNBOND_REQUEST_SERIALIZE_TEMPLATE: Dict[str, Any] = {
+    **_BOND_SERIALIZE_TEMPLATE,
+    'event_type': _UNBOND_REQUEST_STR,
+}
+_CHANNEL_WITHDRAW_SERIALIZE_TEMPLATE: Dict[str, Any] = {
+    'tx_hash': None,
+    'identity_address': None,
+    'timestamp': None,
+    'pool_id': None,
+    'pool_name': None,
+    'value': None,
+    'event_type': _CHANNEL_WITHDRAW_STR,
+    'token': None,
+}
+_STAKING_DETAIL_SERIALIZE_TEMPLATE: Dict[str, Any] = {
+    'contract_address': None,
+    'pool_id': None,
+    'pool_name': None,
+    'total_staked_amount': None,
+    'apr': None,
+    'adx_balance': None,
+    'adx_unclaimed_balance': None,
+    'dai_unclaimed_balance': None,
+    'adx_profit_loss': None,
+    'dai_profit_loss': None,
+}
+
+# Shared None paddings for the DB tuple columns each event type leaves unset,
+# so to_db_tuple() reuses one preallocated tuple instead of rebuilding the Nones
+_BOND_DB_TUPLE_TAIL = (None, None, None, None)  # unlock_at, channel_id, token, log_index
+_UNBOND_DB_TUPLE_TAIL = (None, None, None, None, None, None)  # nonce up to log_index
+_UNBOND_REQUEST_DB_TUPLE_TAIL = (None, None, None)  # channel_id, token, log_index
+_CHANNEL_WITHDRAW_DB_TUPLE_PADDING = (None, None, None, None)  # bond_id, nonce, slashed_at, unlock_at  # noqa: E501
 
 
 @dataclass(init=True, repr=True)
 class AdexEvent:
+    # __slots__ instead of a per-instance __dict__ since thousands of these
+    # events can be created when processing the staking history. _serialized
+    # holds the cached serialize() result of the subclasses -- events are
+    # fully populated before the API layer serializes them and nothing
+    # mutates them afterwards, so the first computed dict can be reused
+    __slots__ = ('tx_hash', 'address', 'identity_address', 'timestamp', '_serialized')
     tx_hash: str
     address: ChecksumAddress
     identity_address: ChecksumAddress
@@ -70,43 +159,74 @@ class AdexEvent:
         }
 
 
+@lru_cache(maxsize=4096)
+def make_adex_event_core(
+        tx_hash: str,
+        address: ChecksumAddress,
+        identity_address: ChecksumAddress,
+        timestamp: Timestamp,
+) -> AdexEvent:
+    """Get the common core of a staking event, shared between identical inputs
+
+    A single transaction can emit several staking events with the same core
+    data, so deserialization funnels through here to reuse one instance
+    instead of allocating a copy per event. The returned event is read-only
+    by convention; the per-type deserializers copy its attributes out.
+    """
+    return AdexEvent(
+        tx_hash=tx_hash,
+        address=address,
+        identity_address=identity_address,
+        timestamp=timestamp,
+    )
+
+
 @dataclass(init=True, repr=True)
 class Bond(AdexEvent):
+    __slots__ = ('bond_id', 'pool_id', 'value', 'nonce', 'slashed_at')
     bond_id: str
     pool_id: str
     value: Balance
     nonce: int
     slashed_at: Timestamp  # from bond.slashedAtStart
 
-    def serialize(self) -> Dict[str, Any]:
-        common_properties = super().serialize()
-        common_properties.update({
-            'bond_id': self.bond_id,
-            'pool_id': self.pool_id,
-            'pool_name': POOL_ID_POOL_NAME.get(self.pool_id, None),
-            'value': self.value.serialize(),
-            'event_type': str(AdexEventType.BOND),
-        })
-        return common_properties
+    def serialize(
+            self,
+            # bound as defaults so the hot path hits locals instead of global lookups
+            _tom_pool_id: str = TOM_POOL_ID,
+            _tom_pool_name: str = _TOM_POOL_NAME,
+    ) -> Dict[str, Any]:
+        try:
+            return self._serialized
+        except AttributeError:
+            pass
+        result = _BOND_SERIALIZE_TEMPLATE.copy()
+        result['tx_hash'] = self.tx_hash
+        result['identity_address'] = self.identity_address
+        result['timestamp'] = self.timestamp
+        result['bond_id'] = self.bond_id
+        result['pool_id'] = self.pool_id
+        # only one pool exists, so a single compare against the interned id
+        # beats hashing a 66-char hex string for a dict probe per event
+        result['pool_name'] = _tom_pool_name if self.pool_id == _tom_pool_id else None
+        result['value'] = self.value.serialize()
+        self._serialized = result
+        return result
 
     def to_db_tuple(self) -> AdexEventDBTuple:
         return (
-            str(self.tx_hash),
-            str(self.address),
-            str(self.identity_address),
-            int(self.timestamp),
-            str(AdexEventType.BOND),
-            str(self.pool_id),
+            self.tx_hash,
+            self.address,
+            self.identity_address,
+            self.timestamp,
+            _BOND_STR,
+            self.pool_id,
             str(self.value.amount),
             str(self.value.usd_value),
-            str(self.bond_id),
+            self.bond_id,
             self.nonce,
-            int(self.slashed_at),
-            None,  # unlock_at
-            None,  # channel_id
-            None,  # token
-            None,  # log_index
-        )
+            self.slashed_at,
+        ) + _BOND_DB_TUPLE_TAIL
 
     def __str__(self) -> str:
         """Used in DefiEvent processing during accounting"""
@@ -115,39 +235,43 @@ class Bond(AdexEvent):
 
 @dataclass(init=True, repr=True)
 class Unbond(AdexEvent):
+    __slots__ = ('bond_id', 'value', 'pool_id')
     bond_id: str
     value: Balance  # from bond.amount
-    pool_id: str = ''  # from bond.pool_id
-
-    def serialize(self) -> Dict[str, Any]:
-        common_properties = super().serialize()
-        common_properties.update({
-            'bond_id': self.bond_id,
-            'pool_id': self.pool_id,
-            'pool_name': POOL_ID_POOL_NAME.get(self.pool_id, None),
-            'value': self.value.serialize(),
-            'event_type': str(AdexEventType.UNBOND),
-        })
-        return common_properties
+    pool_id: str  # from bond.pool_id
+
+    def serialize(
+            self,
+            _tom_pool_id: str = TOM_POOL_ID,
+            _tom_pool_name: str = _TOM_POOL_NAME,
+    ) -> Dict[str, Any]:
+        try:
+            return self._serialized
+        except AttributeError:
+            pass
+        result = _UNBOND_SERIALIZE_TEMPLATE.copy()
+        result['tx_hash'] = self.tx_hash
+        result['identity_address'] = self.identity_address
+        result['timestamp'] = self.timestamp
+        result['bond_id'] = self.bond_id
+        result['pool_id'] = self.pool_id
+        result['pool_name'] = _tom_pool_name if self.pool_id == _tom_pool_id else None
+        result['value'] = self.value.serialize()
+        self._serialized = result
+        return result
 
     def to_db_tuple(self) -> AdexEventDBTuple:
         return (
-            str(self.tx_hash),
-            str(self.address),
-            str(self.identity_address),
-            int(self.timestamp),
-            str(AdexEventType.UNBOND),
-            str(self.pool_id),
+            self.tx_hash,
+            self.address,
+            self.identity_address,
+            self.timestamp,
+            _UNBOND_STR,
+            self.pool_id,
             str(self.value.amount),
             str(self.value.usd_value),
-            str(self.bond_id),
-            None,  # nonce
-            None,  # slashed_at
-            None,  # unlock_at
-            None,  # channel_id
-            None,  # token
-            None,  # log_index
-        )
+            self.bond_id,
+        ) + _UNBOND_DB_TUPLE_TAIL
 
     def __str__(self) -> str:
         """Used in DefiEvent processing during accounting"""
@@ -156,40 +280,47 @@ class Unbond(AdexEvent):
 
 @dataclass(init=True, repr=True)
 class UnbondRequest(AdexEvent):
+    __slots__ = ('bond_id', 'unlock_at', 'value', 'pool_id')
     bond_id: str
     unlock_at: Timestamp  # from unbondRequest.willUnlock
     value: Balance  # from bond.amount
-    pool_id: str = ''  # from bond.pool_id
-
-    def serialize(self) -> Dict[str, Any]:
-        common_properties = super().serialize()
-        common_properties.update({
-            'bond_id': self.bond_id,
-            'pool_id': self.pool_id,
-            'pool_name': POOL_ID_POOL_NAME.get(self.pool_id, None),
-            'value': self.value.serialize(),
-            'event_type': str(AdexEventType.UNBOND_REQUEST),
-        })
-        return common_properties
+    pool_id: str  # from bond.pool_id
+
+    def serialize(
+            self,
+            _tom_pool_id: str = TOM_POOL_ID,
+            _tom_pool_name: str = _TOM_POOL_NAME,
+    ) -> Dict[str, Any]:
+        try:
+            return self._serialized
+        except AttributeError:
+            pass
+        result = _UNBOND_REQUEST_SERIALIZE_TEMPLATE.copy()
+        result['tx_hash'] = self.tx_hash
+        result['identity_address'] = self.identity_address
+        result['timestamp'] = self.timestamp
+        result['bond_id'] = self.bond_id
+        result['pool_id'] = self.pool_id
+        result['pool_name'] = _tom_pool_name if self.pool_id == _tom_pool_id else None
+        result['value'] = self.value.serialize()
+        self._serialized = result
+        return result
 
     def to_db_tuple(self) -> AdexEventDBTuple:
         return (
-            str(self.tx_hash),
-            str(self.address),
-            str(self.identity_address),
-            int(self.timestamp),
-            str(AdexEventType.UNBOND_REQUEST),
-            str(self.pool_id),
+            self.tx_hash,
+            self.address,
+            self.identity_address,
+            self.timestamp,
+            _UNBOND_REQUEST_STR,
+            self.pool_id,
             str(self.value.amount),
             str(self.value.usd_value),
-            str(self.bond_id),
+            self.bond_id,
             None,  # nonce
             None,  # slashed_at
-            int(self.unlock_at),
-            None,  # channel_id
-            None,  # token
-            None,  # log_index
-        )
+            self.unlock_at,
+        ) + _UNBOND_REQUEST_DB_TUPLE_TAIL
 
     def __str__(self) -> str:
         """Used in DefiEvent processing during accounting"""
@@ -198,40 +329,47 @@ class UnbondRequest(AdexEvent):
 
 @dataclass(init=True, repr=True)
 class ChannelWithdraw(AdexEvent):
+    __slots__ = ('value', 'channel_id', 'pool_id', 'token', 'log_index')
     value: Balance
     channel_id: str
     pool_id: str
     token: EthereumToken
     log_index: int
 
-    def serialize(self) -> Dict[str, Any]:
-        common_properties = super().serialize()
-        common_properties.update({
-            'pool_id': self.pool_id,
-            'pool_name': POOL_ID_POOL_NAME.get(self.pool_id, None),
-            'value': self.value.serialize(),
-            'event_type': str(AdexEventType.CHANNEL_WITHDRAW),
-            'token': self.token.serialize(),
-        })
-        return common_properties
+    def serialize(
+            self,
+            _tom_pool_id: str = TOM_POOL_ID,
+            _tom_pool_name: str = _TOM_POOL_NAME,
+    ) -> Dict[str, Any]:
+        try:
+            return self._serialized
+        except AttributeError:
+            pass
+        result = _CHANNEL_WITHDRAW_SERIALIZE_TEMPLATE.copy()
+        result['tx_hash'] = self.tx_hash
+        result['identity_address'] = self.identity_address
+        result['timestamp'] = self.timestamp
+        result['pool_id'] = self.pool_id
+        result['pool_name'] = _tom_pool_name if self.pool_id == _tom_pool_id else None
+        result['value'] = self.value.serialize()
+        result['token'] = self.token.serialize()
+        self._serialized = result
+        return result
 
     def to_db_tuple(self) -> AdexEventDBTuple:
         return (
-            str(self.tx_hash),
-            str(self.address),
-            str(self.identity_address),
-            int(self.timestamp),
-            str(AdexEventType.CHANNEL_WITHDRAW),
-            str(self.pool_id),
+            self.tx_hash,
+            self.address,
+            self.identity_address,
+            self.timestamp,
+            _CHANNEL_WITHDRAW_STR,
+            self.pool_id,
             str(self.value.amount),
             str(self.value.usd_value),
-            None,  # bond_id
-            None,  # nonce
-            None,  # slashed_at
-            None,  # unlocked_at
-            str(self.channel_id),
+        ) + _CHANNEL_WITHDRAW_DB_TUPLE_PADDING + (
+            self.channel_id,
             self.token.serialize(),
-            int(self.log_index),
+            self.log_index,
         )
 
     def __str__(self) -> str:
@@ -246,12 +384,14 @@ class ADXStakingEvents(NamedTuple):
     channel_withdraws: List[ChannelWithdraw]
 
     def get_all(self) -> List[Union[Bond, Unbond, UnbondRequest, ChannelWithdraw]]:
-        return (
-            self.bonds +
-            self.unbonds +  # type: ignore # concatenating lists
-            self.unbond_requests +  # type: ignore # concatenating lists
-            self.channel_withdraws  # type: ignore # concatenating lists
-        )
+        # a single build instead of pairwise + concatenations, which would
+        # allocate an intermediate list per operand
+        all_events: List[Union[Bond, Unbond, UnbondRequest, ChannelWithdraw]] = []
+        all_events.extend(self.bonds)
+        all_events.extend(self.unbonds)
+        all_events.extend(self.unbond_requests)
+        all_events.extend(self.channel_withdraws)
+        return all_events
 
 
 class ADXStakingDetail(NamedTuple):
@@ -267,18 +407,18 @@ class ADXStakingDetail(NamedTuple):
     dai_profit_loss: Balance
 
     def serialize(self) -> Dict[str, Any]:
-        return {
-            'contract_address': self.contract_address,
-            'pool_id': self.pool_id,
-            'pool_name': self.pool_name,
-            'total_staked_amount': str(self.total_staked_amount),
-            'apr': self.apr.to_percentage(precision=2),
-            'adx_balance': self.adx_balance.serialize(),
-            'adx_unclaimed_balance': self.adx_unclaimed_balance.serialize(),
-            'dai_unclaimed_balance': self.dai_unclaimed_balance.serialize(),
-            'adx_profit_loss': self.adx_profit_loss.serialize(),
-            'dai_profit_loss': self.dai_profit_loss.serialize(),
-        }
+        result = _STAKING_DETAIL_SERIALIZE_TEMPLATE.copy()
+        result['contract_address'] = self.contract_address
+        result['pool_id'] = self.pool_id
+        result['pool_name'] = self.pool_name
+        result['total_staked_amount'] = str(self.total_staked_amount)
+        result['apr'] = self.apr.to_percentage(precision=2)
+        result['adx_balance'] = self.adx_balance.serialize()
+        result['adx_unclaimed_balance'] = self.adx_unclaimed_balance.serialize()
+        result['dai_unclaimed_balance'] = self.dai_unclaimed_balance.serialize()
+        result['adx_profit_loss'] = self.adx_profit_loss.serialize()
+        result['dai_profit_loss'] = self.dai_profit_loss.serialize()
+        return result
 
 
 class ADXStakingHistory(NamedTuple):
@@ -286,9 +426,12 @@ class ADXStakingHistory(NamedTuple):
     staking_details: List[ADXStakingDetail]
 
     def serialize(self) -> Dict[str, Any]:
+        # map() keeps the per-event dispatch in C, which matters for histories
+        # with thousands of events
+        serialize_method = operator.methodcaller('serialize')
         return {
-            'events': [event.serialize() for event in self.events],
-            'staking_details': [detail.serialize() for detail in self.staking_details],
+            'events': list(map(serialize_method, self.events)),
+            'staking_details': list(map(serialize_method, self.staking_details)),
         }
 
 
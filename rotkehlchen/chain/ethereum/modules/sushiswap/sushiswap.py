@@ -1,5 +1,7 @@
+import itertools
 import logging
 from collections import defaultdict
+from operator import attrgetter
 from typing import TYPE_CHECKING, List, Optional
 
 from rotkehlchen.chain.ethereum.graph import Graph
@@ -21,6 +23,7 @@ from rotkehlchen.premium.premium import Premium
 from rotkehlchen.types import ChecksumEthAddress, Location, Timestamp
 from rotkehlchen.user_messages import MessagesAggregator
 from rotkehlchen.utils.interfaces import EthereumModule
+from rotkehlchen.utils.mixins.cacheable import cache_response_timewise
 
 if TYPE_CHECKING:
     from rotkehlchen.accounting.structures.balance import AssetBalance
@@ -86,13 +89,19 @@ class Sushiswap(AMMSwapPlatform, EthereumModule):
         existing_addresses: List[ChecksumEthAddress] = []
         min_end_ts: Timestamp = to_timestamp
 
-        # Get addresses' last used query range for Sushiswap events
+        # Get all addresses' last used query range for Sushiswap events at once
+        used_ranges = self.database.get_used_query_ranges(
+            names=[f'{SUSHISWAP_EVENTS_PREFIX}_{address}' for address in addresses],
+        )
         for address in addresses:
-            entry_name = f'{SUSHISWAP_EVENTS_PREFIX}_{address}'
-            events_range = self.database.get_used_query_range(name=entry_name)
+            events_range = used_ranges.get(f'{SUSHISWAP_EVENTS_PREFIX}_{address}')
 
             if not events_range:
                 new_addresses.append(address)
+            elif events_range[1] >= to_timestamp:
+                # The saved range already covers the requested period, so the
+                # address needs no subgraph requests at all
+                continue
             else:
                 existing_addresses.append(address)
                 min_end_ts = min(min_end_ts, events_range[1])
@@ -100,62 +109,53 @@ class Sushiswap(AMMSwapPlatform, EthereumModule):
         # Request new addresses' events
         if new_addresses:
             start_ts = Timestamp(0)
-            for address in new_addresses:
-                for event_type in EventType:
-                    new_address_events = self._get_events_graph(
-                        address=address,
-                        start_ts=start_ts,
-                        end_ts=to_timestamp,
-                        event_type=event_type,
-                    )
-                    if new_address_events:
-                        address_events[address].extend(new_address_events)
-
-                # Insert new address' last used query range
-                self.database.update_used_query_range(
-                    name=f'{SUSHISWAP_EVENTS_PREFIX}_{address}',
-                    start_ts=start_ts,
-                    end_ts=to_timestamp,
-                )
+            self._query_events_graph_concurrently(
+                addresses=new_addresses,
+                start_ts=start_ts,
+                end_ts=to_timestamp,
+                address_events=address_events,
+            )
+            # Insert new addresses' last used query range in one write
+            self.database.update_used_query_ranges([
+                (f'{SUSHISWAP_EVENTS_PREFIX}_{address}', start_ts, to_timestamp)
+                for address in new_addresses
+            ])
 
         # Request existing DB addresses' events
         if existing_addresses and to_timestamp > min_end_ts:
-            for address in existing_addresses:
-                for event_type in EventType:
-                    address_new_events = self._get_events_graph(
-                        address=address,
-                        start_ts=min_end_ts,
-                        end_ts=to_timestamp,
-                        event_type=event_type,
-                    )
-                    if address_new_events:
-                        address_events[address].extend(address_new_events)
-
-                # Update existing address' last used query range
-                self.database.update_used_query_range(
-                    name=f'{SUSHISWAP_EVENTS_PREFIX}_{address}',
-                    start_ts=min_end_ts,
-                    end_ts=to_timestamp,
-                )
+            self._query_events_graph_concurrently(
+                addresses=existing_addresses,
+                start_ts=min_end_ts,
+                end_ts=to_timestamp,
+                address_events=address_events,
+            )
+            # Update existing addresses' last used query range in one write
+            self.database.update_used_query_ranges([
+                (f'{SUSHISWAP_EVENTS_PREFIX}_{address}', min_end_ts, to_timestamp)
+                for address in existing_addresses
+            ])
 
         # Insert requested events in DB
-        all_events = []
-        for address in filter(lambda x: x in address_events, addresses):
-            all_events.extend(address_events[address])
+        all_events = [
+            event
+            for address in addresses
+            if address in address_events
+            for event in address_events[address]
+        ]
         self.database.add_amm_events(all_events)
 
-        # Fetch all DB events within the time range
-        for address in addresses:
-            db_events = self.database.get_amm_events(
-                events=[EventType.MINT_SUSHISWAP, EventType.BURN_SUSHISWAP],
-                from_ts=from_timestamp,
-                to_ts=to_timestamp,
-                address=address,
-            )
-            if db_events:
-                # return events with the oldest first
-                db_events.sort(key=lambda event: (event.timestamp, event.log_index))
-                db_address_events[address] = db_events
+        # Fetch all addresses' DB events within the time range in one query.
+        # The query returns them grouped by address and with the oldest first
+        # within each address, so one grouping pass replaces both the
+        # per-address queries and the per-address sorts
+        db_events = self.database.get_amm_events(
+            events=[EventType.MINT_SUSHISWAP, EventType.BURN_SUSHISWAP],
+            from_ts=from_timestamp,
+            to_ts=to_timestamp,
+            addresses=addresses,
+        )
+        for grouped_address, grouped_events in itertools.groupby(db_events, attrgetter('address')):  # noqa: E501
+            db_address_events[grouped_address] = list(grouped_events)
 
         # Request addresses' current balances (LP and underlying tokens)
         # if there is no specific time range in this endpoint call (i.e. all
@@ -180,6 +180,7 @@ class Sushiswap(AMMSwapPlatform, EthereumModule):
 
         return address_events_balances
 
+    @cache_response_timewise()
     def get_balances(
         self,
         addresses: List[ChecksumEthAddress],
@@ -188,6 +189,10 @@ class Sushiswap(AMMSwapPlatform, EthereumModule):
 
         Premium users can request balances either via the Sushiswap subgraph or
         on-chain.
+
+        The result is cached timewise, so repeat callers within the cache TTL
+        reuse the same snapshot instead of redoing a full subgraph crawl.
+        A live query can be forced with the decorator's ignore_cache=True.
         """
         protocol_balance = self._get_balances_graph(addresses=addresses)
 
@@ -252,6 +257,7 @@ class Sushiswap(AMMSwapPlatform, EthereumModule):
     def deactivate(self) -> None:
         self.database.delete_sushiswap_trades_data()
         self.database.delete_sushiswap_events_data()
+        self.results_cache.clear()
 
     def on_account_addition(self, address: ChecksumEthAddress) -> Optional[List['AssetBalance']]:
         pass
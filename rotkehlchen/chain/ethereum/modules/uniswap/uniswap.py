@@ -1,9 +1,10 @@
+import itertools
 import logging
 from collections import defaultdict
-from typing import TYPE_CHECKING, List, Optional, Set
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
 
 from rotkehlchen.assets.asset import EthereumToken
-from rotkehlchen.assets.utils import get_or_create_ethereum_token
 from rotkehlchen.chain.ethereum.graph import GRAPH_QUERY_LIMIT, Graph, format_query_indentation
 from rotkehlchen.chain.ethereum.interfaces.ammswap import UNISWAP_TRADES_PREFIX
 from rotkehlchen.chain.ethereum.interfaces.ammswap.ammswap import AMMSwapPlatform
@@ -17,7 +18,10 @@ from rotkehlchen.chain.ethereum.interfaces.ammswap.types import (
     EventType,
     ProtocolBalance,
 )
-from rotkehlchen.chain.ethereum.interfaces.ammswap.utils import SUBGRAPH_REMOTE_ERROR_MSG
+from rotkehlchen.chain.ethereum.interfaces.ammswap.utils import (
+    SUBGRAPH_REMOTE_ERROR_MSG,
+    deserialize_ethereum_address_cached,
+)
 from rotkehlchen.chain.ethereum.trades import AMMSwap, AMMTrade
 from rotkehlchen.constants import ZERO
 from rotkehlchen.errors.misc import ModuleInitializationFailure, RemoteError
@@ -25,13 +29,11 @@ from rotkehlchen.errors.serialization import DeserializationError
 from rotkehlchen.fval import FVal
 from rotkehlchen.logging import RotkehlchenLogsAdapter
 from rotkehlchen.premium.premium import Premium
-from rotkehlchen.serialization.deserialize import (
-    deserialize_asset_amount_force_positive,
-    deserialize_ethereum_address,
-)
+from rotkehlchen.serialization.deserialize import deserialize_asset_amount_force_positive
 from rotkehlchen.types import AssetAmount, ChecksumEthAddress, Location, Timestamp
 from rotkehlchen.user_messages import MessagesAggregator
 from rotkehlchen.utils.interfaces import EthereumModule
+from rotkehlchen.utils.mixins.cacheable import cache_response_timewise
 
 from .graph import V3_SWAPS_QUERY
 from .utils import get_latest_lp_addresses, uniswap_lp_token_balances
@@ -46,6 +48,17 @@ log = RotkehlchenLogsAdapter(logger)
 
 UNISWAP_EVENTS_PREFIX = 'uniswap_events'
 
+# The v3 swaps query string and its parameter types are fully static, so
+# format them once at import instead of once per query call
+V3_SWAPS_QUERYSTR = format_query_indentation(V3_SWAPS_QUERY.format())
+V3_SWAPS_PARAM_TYPES = {
+    '$limit': 'Int!',
+    '$offset': 'Int!',
+    '$address': 'Bytes!',
+    '$start_ts': 'BigInt!',
+    '$end_ts': 'BigInt!',
+}
+
 
 class Uniswap(AMMSwapPlatform, EthereumModule):
     """Uniswap integration module
@@ -130,13 +143,19 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
         existing_addresses: List[ChecksumEthAddress] = []
         min_end_ts: Timestamp = to_timestamp
 
-        # Get addresses' last used query range for Uniswap events
+        # Get all addresses' last used query range for Uniswap events at once
+        used_ranges = self.database.get_used_query_ranges(
+            names=[f'{UNISWAP_EVENTS_PREFIX}_{address}' for address in addresses],
+        )
         for address in addresses:
-            entry_name = f'{UNISWAP_EVENTS_PREFIX}_{address}'
-            events_range = self.database.get_used_query_range(name=entry_name)
+            events_range = used_ranges.get(f'{UNISWAP_EVENTS_PREFIX}_{address}')
 
             if not events_range:
                 new_addresses.append(address)
+            elif events_range[1] >= to_timestamp:
+                # The saved range already covers the requested period, so the
+                # address needs no subgraph requests at all
+                continue
             else:
                 existing_addresses.append(address)
                 min_end_ts = min(min_end_ts, events_range[1])
@@ -144,63 +163,53 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
         # Request new addresses' events
         if new_addresses:
             start_ts = Timestamp(0)
-            for address in new_addresses:
-                for event_type in EventType:
-                    new_address_events = self._get_events_graph(
-                        address=address,
-                        start_ts=start_ts,
-                        end_ts=to_timestamp,
-                        event_type=event_type,
-                    )
-                    if new_address_events:
-                        address_events[address].extend(new_address_events)
-
-                # Insert new address' last used query range
-                self.database.update_used_query_range(
-                    name=f'{UNISWAP_EVENTS_PREFIX}_{address}',
-                    start_ts=start_ts,
-                    end_ts=to_timestamp,
-                )
+            self._query_events_graph_concurrently(
+                addresses=new_addresses,
+                start_ts=start_ts,
+                end_ts=to_timestamp,
+                address_events=address_events,
+            )
+            # Insert new addresses' last used query range in one write
+            self.database.update_used_query_ranges([
+                (f'{UNISWAP_EVENTS_PREFIX}_{address}', start_ts, to_timestamp)
+                for address in new_addresses
+            ])
 
         # Request existing DB addresses' events
         if existing_addresses and to_timestamp > min_end_ts:
-            for address in existing_addresses:
-                for event_type in EventType:
-                    address_new_events = self._get_events_graph(
-                        address=address,
-                        start_ts=min_end_ts,
-                        end_ts=to_timestamp,
-                        event_type=event_type,
-                    )
-                    if address_new_events:
-                        address_events[address].extend(address_new_events)
-
-                # Update existing address' last used query range
-                self.database.update_used_query_range(
-                    name=f'{UNISWAP_EVENTS_PREFIX}_{address}',
-                    start_ts=min_end_ts,
-                    end_ts=to_timestamp,
-                )
+            self._query_events_graph_concurrently(
+                addresses=existing_addresses,
+                start_ts=min_end_ts,
+                end_ts=to_timestamp,
+                address_events=address_events,
+            )
+            # Update existing addresses' last used query range in one write
+            self.database.update_used_query_ranges([
+                (f'{UNISWAP_EVENTS_PREFIX}_{address}', min_end_ts, to_timestamp)
+                for address in existing_addresses
+            ])
 
         # Insert requested events in DB
-        all_events = []
-        for address in filter(lambda x: x in address_events, addresses):
-            all_events.extend(address_events[address])
-
+        all_events = [
+            event
+            for address in addresses
+            if address in address_events
+            for event in address_events[address]
+        ]
         self.database.add_amm_events(all_events)
 
-        # Fetch all DB events within the time range
-        for address in addresses:
-            db_events = self.database.get_amm_events(
-                events=[EventType.MINT_UNISWAP, EventType.BURN_UNISWAP],
-                from_ts=from_timestamp,
-                to_ts=to_timestamp,
-                address=address,
-            )
-            if db_events:
-                # return events with the oldest first
-                db_events.sort(key=lambda event: (event.timestamp, event.log_index))
-                db_address_events[address] = db_events
+        # Fetch all addresses' DB events within the time range in one query.
+        # The query returns them grouped by address and with the oldest first
+        # within each address, so one grouping pass replaces both the
+        # per-address queries and the per-address sorts
+        db_events = self.database.get_amm_events(
+            events=[EventType.MINT_UNISWAP, EventType.BURN_UNISWAP],
+            from_ts=from_timestamp,
+            to_ts=to_timestamp,
+            addresses=addresses,
+        )
+        for grouped_address, grouped_events in itertools.groupby(db_events, attrgetter('address')):  # noqa: E501
+            db_address_events[grouped_address] = list(grouped_events)
 
         # Request addresses' current balances (UNI-V2s and underlying tokens)
         # if there is no specific time range in this endpoint call (i.e. all
@@ -244,13 +253,19 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
         if only_cache:
             return self._fetch_trades_from_db(addresses, from_timestamp, to_timestamp)
 
-        # Get addresses' last used query range for Uniswap trades
+        # Get all addresses' last used query range for Uniswap trades at once
+        used_ranges = self.database.get_used_query_ranges(
+            names=[f'{UNISWAP_TRADES_PREFIX}_{address}' for address in addresses],
+        )
         for address in addresses:
-            entry_name = f'{UNISWAP_TRADES_PREFIX}_{address}'
-            trades_range = self.database.get_used_query_range(name=entry_name)
+            trades_range = used_ranges.get(f'{UNISWAP_TRADES_PREFIX}_{address}')
 
             if not trades_range:
                 new_addresses.append(address)
+            elif trades_range[1] >= to_timestamp:
+                # The saved range already covers the requested period, so the
+                # address needs no subgraph requests at all
+                continue
             else:
                 existing_addresses.append(address)
                 min_end_ts = min(min_end_ts, trades_range[1])
@@ -265,14 +280,11 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
             )
             address_amm_trades.update(new_address_trades)
 
-            # Insert last used query range for new addresses
-            for address in new_addresses:
-                entry_name = f'{UNISWAP_TRADES_PREFIX}_{address}'
-                self.database.update_used_query_range(
-                    name=entry_name,
-                    start_ts=start_ts,
-                    end_ts=to_timestamp,
-                )
+            # Insert last used query range for new addresses in one write
+            self.database.update_used_query_ranges([
+                (f'{UNISWAP_TRADES_PREFIX}_{address}', start_ts, to_timestamp)
+                for address in new_addresses
+            ])
 
         # Request existing DB addresses' trades
         if existing_addresses and to_timestamp > min_end_ts:
@@ -283,23 +295,22 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
             )
             address_amm_trades.update(address_new_trades)
 
-            # Update last used query range for existing addresses
-            for address in existing_addresses:
-                entry_name = f'{UNISWAP_TRADES_PREFIX}_{address}'
-                self.database.update_used_query_range(
-                    name=entry_name,
-                    start_ts=min_end_ts,
-                    end_ts=to_timestamp,
-                )
-
-        # Insert all unique swaps to the DB
-        all_swaps = set()
-        for address in filter(lambda x: x in address_amm_trades, addresses):
-            for trade in address_amm_trades[address]:
-                for swap in trade.swaps:
-                    all_swaps.add(swap)
-
-        self.database.add_amm_swaps(list(all_swaps))
+            # Update last used query range for existing addresses in one write
+            self.database.update_used_query_ranges([
+                (f'{UNISWAP_TRADES_PREFIX}_{address}', min_end_ts, to_timestamp)
+                for address in existing_addresses
+            ])
+
+        # Insert all unique swaps to the DB, deduplicated on the identity key
+        # directly so only a two-field tuple is hashed per swap
+        unique_swaps = {
+            (swap.tx_hash, swap.log_index): swap
+            for address in addresses
+            if address in address_amm_trades
+            for trade in address_amm_trades[address]
+            for swap in trade.swaps
+        }
+        self.database.add_amm_swaps(list(unique_swaps.values()))
         return self._fetch_trades_from_db(addresses, from_timestamp, to_timestamp)
 
     def _get_trades_graph_for_address(
@@ -325,6 +336,80 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
             )
         return trades
 
+    def _deserialize_v3_swap_from_graph(
+            self,
+            swap: Dict[str, Any],
+            address: ChecksumEthAddress,
+            token_cache: Dict[ChecksumEthAddress, EthereumToken],
+    ) -> Optional[AMMSwap]:
+        """Turn one Uniswap V3 subgraph swap entry into an <AMMSwap>
+
+        Returns None, after logging, for swaps whose addresses or amounts
+        can't be deserialized.
+        """
+        timestamp = swap['timestamp']
+        swap_token0 = swap['token0']
+        swap_token1 = swap['token1']
+
+        try:
+            token0_deserialized = deserialize_ethereum_address_cached(swap_token0['id'])
+            token1_deserialized = deserialize_ethereum_address_cached(swap_token1['id'])
+            from_address_deserialized = deserialize_ethereum_address_cached(swap['sender'])
+            to_address_deserialized = deserialize_ethereum_address_cached(swap['recipient'])
+        except DeserializationError:
+            msg = (
+                f'Failed to deserialize addresses in trade from uniswap graph with '
+                f'token 0: {swap_token0["id"]}, token 1: {swap_token1["id"]}, '
+                f'swap sender: {swap["sender"]}, swap receiver {swap["to"]}'
+            )
+            log.error(msg)
+            return None
+
+        token0 = self._get_or_create_graph_token(
+            token_data=swap_token0,
+            token_address=token0_deserialized,
+            token_cache=token_cache,
+        )
+        token1 = self._get_or_create_graph_token(
+            token_data=swap_token1,
+            token_address=token1_deserialized,
+            token_cache=token_cache,
+        )
+
+        try:
+            if swap['amount0'].startswith('-'):
+                amount0_in = AssetAmount(FVal(ZERO))
+                amount0_out = deserialize_asset_amount_force_positive(swap['amount0'])
+                amount1_in = deserialize_asset_amount_force_positive(swap['amount1'])
+                amount1_out = AssetAmount(FVal(ZERO))
+            else:
+                amount0_in = deserialize_asset_amount_force_positive(swap['amount0'])
+                amount0_out = AssetAmount(FVal(ZERO))
+                amount1_in = AssetAmount(FVal(ZERO))
+                amount1_out = deserialize_asset_amount_force_positive(swap['amount1'])
+        except ValueError as e:
+            log.error(
+                f'Failed to read amounts in Uniswap V3 swap {str(swap)}. '
+                f'{str(e)}.',
+            )
+            return None
+
+        return AMMSwap(
+            tx_hash=swap['id'].split('#')[0],
+            log_index=int(swap['logIndex']),
+            address=address,
+            from_address=from_address_deserialized,
+            to_address=to_address_deserialized,
+            timestamp=Timestamp(int(timestamp)),
+            location=Location.UNISWAP,
+            token0=token0,
+            token1=token1,
+            amount0_in=amount0_in,
+            amount1_in=amount1_in,
+            amount0_out=amount0_out,
+            amount1_out=amount1_out,
+        )
+
     def _get_trades_graph_v3_for_address(
             self,
             address: ChecksumEthAddress,
@@ -350,27 +435,20 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
         - RemoteError
         """
         trades: List[AMMTrade] = []
-        param_types = {
-            '$limit': 'Int!',
-            '$offset': 'Int!',
-            '$address': 'Bytes!',
-            '$start_ts': 'BigInt!',
-            '$end_ts': 'BigInt!',
-        }
-        param_values = {
+        param_values: Dict[str, Any] = {
             'limit': GRAPH_QUERY_LIMIT,
             'offset': 0,
             'address': address.lower(),
             'start_ts': str(start_ts),
             'end_ts': str(end_ts),
         }
-        querystr = format_query_indentation(V3_SWAPS_QUERY.format())
+        token_cache: Dict[ChecksumEthAddress, EthereumToken] = {}
 
         while True:
             try:
                 result = self.graph_v3.query(
-                    querystr=querystr,
-                    param_types=param_types,
+                    querystr=V3_SWAPS_QUERYSTR,
+                    param_types=V3_SWAPS_PARAM_TYPES,
                     param_values=param_values,
                 )
             except RemoteError as e:
@@ -384,77 +462,18 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
 
             result_data = result['swaps']
             for entry in result_data:
-                swaps = []
-                for swap in entry['transaction']['swaps']:
-                    timestamp = swap['timestamp']
-                    swap_token0 = swap['token0']
-                    swap_token1 = swap['token1']
-
-                    try:
-                        token0_deserialized = deserialize_ethereum_address(swap_token0['id'])
-                        token1_deserialized = deserialize_ethereum_address(swap_token1['id'])
-                        from_address_deserialized = deserialize_ethereum_address(swap['sender'])
-                        to_address_deserialized = deserialize_ethereum_address(swap['recipient'])
-                    except DeserializationError:
-                        msg = (
-                            f'Failed to deserialize addresses in trade from uniswap graph with '
-                            f'token 0: {swap_token0["id"]}, token 1: {swap_token1["id"]}, '
-                            f'swap sender: {swap["sender"]}, swap receiver {swap["to"]}'
-                        )
-                        log.error(msg)
-                        continue
-
-                    token0 = get_or_create_ethereum_token(
-                        userdb=self.database,
-                        symbol=swap_token0['symbol'],
-                        ethereum_address=token0_deserialized,
-                        name=swap_token0['name'],
-                        decimals=swap_token0['decimals'],
-                    )
-                    token1 = get_or_create_ethereum_token(
-                        userdb=self.database,
-                        symbol=swap_token1['symbol'],
-                        ethereum_address=token1_deserialized,
-                        name=swap_token1['name'],
-                        decimals=int(swap_token1['decimals']),
-                    )
-
-                    try:
-                        if swap['amount0'].startswith('-'):
-                            amount0_in = AssetAmount(FVal(ZERO))
-                            amount0_out = deserialize_asset_amount_force_positive(swap['amount0'])
-                            amount1_in = deserialize_asset_amount_force_positive(swap['amount1'])
-                            amount1_out = AssetAmount(FVal(ZERO))
-                        else:
-                            amount0_in = deserialize_asset_amount_force_positive(swap['amount0'])
-                            amount0_out = AssetAmount(FVal(ZERO))
-                            amount1_in = AssetAmount(FVal(ZERO))
-                            amount1_out = deserialize_asset_amount_force_positive(swap['amount1'])
-                    except ValueError as e:
-                        log.error(
-                            f'Failed to read amounts in Uniswap V3 swap {str(swap)}. '
-                            f'{str(e)}.',
-                        )
-                        continue
-
-                    swaps.append(AMMSwap(
-                        tx_hash=swap['id'].split('#')[0],
-                        log_index=int(swap['logIndex']),
+                maybe_swaps = [
+                    self._deserialize_v3_swap_from_graph(
+                        swap=swap,
                         address=address,
-                        from_address=from_address_deserialized,
-                        to_address=to_address_deserialized,
-                        timestamp=Timestamp(int(timestamp)),
-                        location=Location.UNISWAP,
-                        token0=token0,
-                        token1=token1,
-                        amount0_in=amount0_in,
-                        amount1_in=amount1_in,
-                        amount0_out=amount0_out,
-                        amount1_out=amount1_out,
-                    ))
-
-                # with the new logic the list of swaps can be empty, in that case don't try
+                        token_cache=token_cache,
+                    )
+                    for swap in entry['transaction']['swaps']
+                ]
+                # swaps that failed to deserialize are None, and with the new
+                # logic the list of swaps can be empty, in that case don't try
                 # to make trades from the swaps
+                swaps = [swap for swap in maybe_swaps if swap is not None]
                 if len(swaps) == 0:
                     continue
 
@@ -464,13 +483,11 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
             if len(result_data) < GRAPH_QUERY_LIMIT:
                 break
 
-            # Update pagination step
-            param_values = {
-                **param_values,
-                'offset': param_values['offset'] + GRAPH_QUERY_LIMIT,  # type: ignore
-            }
+            # Update pagination step in place
+            param_values['offset'] += GRAPH_QUERY_LIMIT
         return trades
 
+    @cache_response_timewise()
     def get_balances(
         self,
         addresses: List[ChecksumEthAddress],
@@ -479,6 +496,11 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
 
         Premium users can request balances either via the Uniswap subgraph or
         on-chain.
+
+        The result is cached timewise, so repeat callers within the cache TTL
+        reuse the same snapshot instead of redoing a full subgraph crawl or
+        chain query. A live query can be forced with the decorator's
+        ignore_cache=True.
         """
         if self.premium:
             protocol_balance = self._get_balances_graph(addresses=addresses)
@@ -532,6 +554,7 @@ class Uniswap(AMMSwapPlatform, EthereumModule):
     def deactivate(self) -> None:
         self.database.delete_uniswap_trades_data()
         self.database.delete_uniswap_events_data()
+        self.results_cache.clear()
 
     def on_account_addition(self, address: ChecksumEthAddress) -> Optional[List['AssetBalance']]:
         pass
@@ -61,7 +61,9 @@ class AMMSwap(NamedTuple):
     amount1_out: AssetAmount
 
     def __hash__(self) -> int:
-        return hash(self.tx_hash + str(self.log_index))
+        # hash the identity fields as a tuple instead of concatenating them,
+        # which would allocate a new string on every hash
+        return hash((self.tx_hash, self.log_index))
 
     def __eq__(self, other: Any) -> bool:
         if other is None:
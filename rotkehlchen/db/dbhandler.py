@@ -864,17 +864,27 @@ class DBHandler:
             """
         )
         cursor = self.conn.cursor()
-        for event in events:
-            event_tuple = event.to_db_tuple()
-            try:
-                cursor.execute(query, event_tuple)
-            except sqlcipher.IntegrityError:  # pylint: disable=no-member
-                self.msg_aggregator.add_warning(
-                    f'Tried to add an AdEx event that already exists in the DB. '
-                    f'Event data: {event_tuple}. Skipping event.',
-                )
-                continue
+        event_tuples = [event.to_db_tuple() for event in events]
+        cursor.execute('SAVEPOINT adex_events_insert')
+        try:
+            cursor.executemany(query, event_tuples)
+        except sqlcipher.IntegrityError:  # pylint: disable=no-member
+            # One of the tuples hit a constraint, most probably already
+            # existing in the DB. Undo the rows the partial bulk insert kept
+            # so the per-event replay below only warns on the genuine
+            # pre-existing duplicates, then write them one by one
+            cursor.execute('ROLLBACK TO SAVEPOINT adex_events_insert')
+            for event_tuple in event_tuples:
+                try:
+                    cursor.execute(query, event_tuple)
+                except sqlcipher.IntegrityError:  # pylint: disable=no-member
+                    self.msg_aggregator.add_warning(
+                        f'Tried to add an AdEx event that already exists in the DB. '
+                        f'Event data: {event_tuple}. Skipping event.',
+                    )
+                    continue
 
+        cursor.execute('RELEASE SAVEPOINT adex_events_insert')
         self.update_last_write()
 
     def get_adex_events(
@@ -1074,17 +1084,27 @@ class DBHandler:
             """
         )
         cursor = self.conn.cursor()
-        for event in events:
-            event_tuple = event.to_db_tuple()
-            try:
-                cursor.execute(query, event_tuple)
-            except sqlcipher.IntegrityError:  # pylint: disable=no-member
-                self.msg_aggregator.add_warning(
-                    f'Tried to add an AMM event that already exists in the DB. '
-                    f'Event data: {event_tuple}. Skipping event.',
-                )
-                continue
+        event_tuples = [event.to_db_tuple() for event in events]
+        cursor.execute('SAVEPOINT amm_events_insert')
+        try:
+            cursor.executemany(query, event_tuples)
+        except sqlcipher.IntegrityError:  # pylint: disable=no-member
+            # That means one of the events hit a constraint, most probably
+            # already existing in the DB. Undo the rows the partial bulk
+            # insert kept so the per-event replay below only warns on the
+            # genuine pre-existing duplicates, then write them one by one
+            cursor.execute('ROLLBACK TO SAVEPOINT amm_events_insert')
+            for event_tuple in event_tuples:
+                try:
+                    cursor.execute(query, event_tuple)
+                except sqlcipher.IntegrityError:  # pylint: disable=no-member
+                    self.msg_aggregator.add_warning(
+                        f'Tried to add an AMM event that already exists in the DB. '
+                        f'Event data: {event_tuple}. Skipping event.',
+                    )
+                    continue
 
+        cursor.execute('RELEASE SAVEPOINT amm_events_insert')
         self.update_last_write()
 
     def get_amm_events(
@@ -1093,9 +1113,14 @@ class DBHandler:
             from_ts: Optional[Timestamp] = None,
             to_ts: Optional[Timestamp] = None,
             address: Optional[ChecksumEthAddress] = None,
+            addresses: Optional[List[ChecksumEthAddress]] = None,
     ) -> List[LiquidityPoolEvent]:
         """Returns a list of amm events optionally filtered by time, location
         and address
+
+        If `addresses` is given all their events are returned by a single
+        query, ordered by address first so that callers can group them with
+        one pass, and by timestamp and log index within each address.
         """
         cursor = self.conn.cursor()
         events_sql_str = ", ".join([f'"{EventType.serialize_for_db(event)}"' for event in events])
@@ -1104,8 +1129,19 @@ class DBHandler:
         # Timestamp filters are omitted, done via `form_query_to_filter_timestamps`
         if address is not None:
             query += f'AND address="{address}" '
+        if addresses is not None:
+            questionmarks = ','.join('?' * len(addresses))
+            query += f'AND address IN ({questionmarks}) '
 
         query, bindings = form_query_to_filter_timestamps(query, 'timestamp', from_ts, to_ts)
+        if addresses is not None:
+            # Let sqlite sort the grouped result instead of a python sort per
+            # address in the caller
+            query = query.replace(
+                'ORDER BY timestamp ASC',
+                'ORDER BY address ASC, timestamp ASC, log_index ASC',
+            )
+            bindings = tuple(addresses) + bindings
         results = cursor.execute(query, bindings)
 
         db_events = []
@@ -1347,6 +1383,31 @@ class DBHandler:
 
         return Timestamp(int(query[0][0])), Timestamp(int(query[0][1]))
 
+    def get_used_query_ranges(
+            self,
+            names: List[str],
+    ) -> Dict[str, Tuple[Timestamp, Timestamp]]:
+        """Get the last queried start/end timestamp range of many names at once
+
+        Names that have never been queried are missing from the returned
+        mapping. A single SELECT instead of one per name, which matters for
+        callers checking the range of every tracked address.
+        """
+        if len(names) == 0:
+            return {}
+        cursor = self.conn.cursor()
+        placeholders = ','.join('?' * len(names))
+        query = cursor.execute(
+            f'SELECT name, start_ts, end_ts FROM used_query_ranges '
+            f'WHERE name IN ({placeholders})',
+            names,
+        )
+        return {
+            name: (Timestamp(int(start_ts)), Timestamp(int(end_ts)))
+            for name, start_ts, end_ts in query
+            if start_ts is not None
+        }
+
     def delete_used_query_range_for_exchange(self, location: Location) -> None:
         """Delete the query ranges for the given exchange name"""
         cursor = self.conn.cursor()
@@ -1389,6 +1450,20 @@ class DBHandler:
         )
         self.update_last_write()
 
+    def update_used_query_ranges(
+            self,
+            entries: List[Tuple[str, Timestamp, Timestamp]],
+    ) -> None:
+        """Update the queried range of many names in one write transaction"""
+        if len(entries) == 0:
+            return
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            'INSERT OR REPLACE INTO used_query_ranges(name, start_ts, end_ts) VALUES (?, ?, ?)',
+            [(name, str(start_ts), str(end_ts)) for name, start_ts, end_ts in entries],
+        )
+        self.update_last_write()
+
     def update_used_block_query_range(self, name: str, from_block: int, to_block: int) -> None:
         self.update_used_query_range(name, from_block, to_block)  # type: ignore
 
@@ -18,7 +18,7 @@ class FVal():
     use this restriction to make sure floating point numbers are rooted from the codebase first.
     """
 
-    __slots__ = ('num',)
+    __slots__ = ('num', '_str')
 
     def __init__(self, data: AcceptableFValInitInput = 0):
 
@@ -46,10 +46,17 @@ class FVal():
             ) from e
 
     def __str__(self) -> str:
-        return str(self.num)
+        # The value never changes after initialization so the Decimal
+        # formatting cost is paid only the first time. Serializing big
+        # structures stringifies the same values repeatedly.
+        try:
+            return self._str
+        except AttributeError:
+            self._str = str(self.num)
+            return self._str
 
     def __repr__(self) -> str:
-        return 'FVal({})'.format(str(self.num))
+        return 'FVal({})'.format(str(self))
 
     def __gt__(self, other: AcceptableFValOtherInput) -> bool:
         evaluated_other = evaluate_input(other)
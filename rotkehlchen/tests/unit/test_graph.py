@@ -86,3 +86,26 @@ def test_success_result():
 
     assert client.execute.call_count == 1
     assert result == expected_result
+
+
+def test_batch_query():
+    """Test batch_query merges its sub-queries into a single aliased request
+    and splits the response back into per-sub-query results in input order.
+    """
+    graph = Graph(TEST_URL_1)
+    querystr = format_query_indentation(TEST_QUERY_1.format())
+    sub_queries = [
+        (querystr, {'$limit': 'Int!'}, {'limit': 1}),
+        (querystr, {'$limit': 'Int!'}, {'limit': 2}),
+    ]
+
+    client = MagicMock()
+    client.execute.return_value = {'q0': [{'data1'}], 'q1': [{'data2'}]}
+
+    with patch.object(graph, 'client', new=client):
+        result = graph.batch_query(sub_queries)
+
+    assert client.execute.call_count == 1
+    assert result == [[{'data1'}], [{'data2'}]]
+    # the variables of each sub-query must have been suffixed to not collide
+    assert client.execute.call_args[1]['variable_values'] == {'limit_0': 1, 'limit_1': 2}